@@ -5,4 +5,4 @@ app = Flask(__name__)  # Create Flask app instance
 CORS(app)  # Enable Cross-Origin Resource Sharing (if needed)
 
 # Import routes (must be after app initialization to avoid circular imports)
-from app import routes
\ No newline at end of file
+from app import routes
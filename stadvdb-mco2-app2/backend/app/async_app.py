@@ -0,0 +1,243 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiomysql
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+from app import app as flask_app
+from app.db_config import central_node, db_config, normalize_isolation, pool_config
+from app.health import health_monitor, is_up, report_failure, report_success
+from app.metrics import PhaseTimer
+from app.replay_log import replay_logs
+from app.replication import decode_read_token, encode_read_token, merge_positions
+from app.result_cache import invalidate_write
+from app.retry import Retry
+from app.router import route
+from app.routes import plan_recovery, precheck_error
+
+async_config = {
+    "pool_size": 100,               # connections per node, every in-flight transaction holds one
+    "max_concurrent_per_node": 100  # transactions running on a node at once, the rest wait their turn
+}
+
+# asyncio-based /simulate and /simulate_crash_recovery: a transaction that is sitting in
+# DO SLEEP or a lock wait only costs a coroutine, so hundreds of them share one event loop.
+# every other endpoint is the flask app, mounted underneath
+
+_pools = {}
+_limits = {}
+
+def jsonify(data, status_code=200):
+    # same encoder as flask's jsonify so both servers answer with identical json
+    return Response(flask_app.json.dumps(data), status_code=status_code, media_type="application/json")
+
+async def _open_pools():
+    for node, config in db_config.items():
+        _pools[node] = await aiomysql.create_pool(
+            host=config["host"],
+            port=config["port"],
+            user=config["user"],
+            password=config["password"],
+            db=config["database"],
+            minsize=0,
+            maxsize=async_config["pool_size"],
+            connect_timeout=pool_config["connect_timeout"],
+            autocommit=False
+        )
+        _limits[node] = asyncio.Semaphore(async_config["max_concurrent_per_node"])
+
+async def _close_pools():
+    for pool in _pools.values():
+        pool.close()
+        await pool.wait_closed()
+    _pools.clear()
+
+def _result(t, node, query, **extra):
+    return dict({"transaction_id": t['id'], "node": node, "query": query}, **extra)
+
+async def _capture_position(cursor):
+    try:
+        await cursor.execute("SHOW MASTER STATUS;")
+        row = await cursor.fetchone()
+    except Exception as e:
+        print(f"Could not read binlog position: {e}")
+        return None
+    return [row["File"], row["Position"]] if row else None
+
+async def run_transaction(t, node, *, status='COMMIT', delay=None, message=None):
+    # async twin of routes.run_transaction, same checks, retries and result
+    query = t['query']
+    isolation_level = t.get('isolation', 'READ COMMITTED')
+    decision = route(query)
+
+    # a table the node doesn't have or a node that is down fails here, without a round-trip
+    error = precheck_error(t, node, decision)
+    if error:
+        return error
+
+    retry = Retry(node)
+    while True:
+        await asyncio.sleep(retry.backoff())
+
+        async with _limits[node]:
+            connection = None
+            timer = PhaseTimer(node, decision.kind)
+            try:
+                connection = await _pools[node].acquire()
+                timer.mark("connect")
+                async with connection.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {normalize_isolation(isolation_level)};")
+                    timer.mark("set_isolation")
+                    await cursor.execute("START TRANSACTION;")
+                    timer.mark("begin")
+
+                    # aiomysql has no server-side prepared statements, params are escaped client-side
+                    await cursor.execute(query, t.get('params'))
+                    result = None
+                    if decision.is_read:
+                        result = await cursor.fetchall()
+                        timer.rows(len(result))
+                    timer.mark("statement")
+
+                    if delay is not None and float(delay) > 0:
+                        await cursor.execute("DO SLEEP(%s);", (float(delay),))
+                        timer.mark("sleep")
+
+                    position = None
+                    if status == 'COMMIT':
+                        await connection.commit()
+                        timer.mark("commit")
+                        if not decision.is_read:
+                            written_at = await _capture_position(cursor) if node != central_node else None
+                            invalidate_write(decision, node, written_at)  # cached reads of its fragments may be off
+                            if t.get('read_your_writes'):
+                                position = written_at
+                    else:
+                        await connection.rollback()
+                        timer.mark("rollback")
+                        timer.rollback("requested")
+
+                report_success(node)
+                outcome = _result(t, node, query, result=result)
+                if position is not None:
+                    outcome["position"] = position
+                if message:
+                    outcome["message"] = message
+                return dict(outcome, **retry.report())
+
+            except Exception as e:
+                report_failure(node, e)
+                timer.error(e)
+                if connection:
+                    try:
+                        await connection.rollback()
+                        timer.mark("rollback")
+                        timer.rollback("error")
+                    except Exception:
+                        pass
+                if retry.should_retry(e):
+                    continue  # the connection and the node's slot are given back before the backoff
+                return _result(t, node, query, error=str(e), **retry.report())
+
+            finally:
+                if connection:
+                    _pools[node].release(connection)
+                timer.finish(query)
+
+async def simulate_transactions(request):
+    data = await request.json()
+    transactions = data.get('transactions', [])
+    read_your_writes = bool(data.get('read_your_writes'))
+
+    try:
+        positions = decode_read_token(data.get('read_token'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}, 400)
+
+    results = []
+    errors = []
+
+    pending = []
+    for t in transactions:
+        if t.get('node') not in db_config:
+            errors.append(_result(t, t.get('node'), t.get('query'), error=f"Unknown node: {t.get('node')}"))
+            continue
+        t = dict(t, read_your_writes=True) if read_your_writes else t
+        pending.append(run_transaction(t, t['node'], status=t.get('status', 'COMMIT'), delay=t.get('delay', 0)))
+
+    # all transactions in flight together on the event loop, per-node limits apply
+    for result in await asyncio.gather(*pending):
+        merge_positions(positions, result['node'], result.pop('position', None))
+        if 'error' in result:
+            errors.append(result)
+        else:
+            results.append(result)
+
+    response = {
+        "status": "success" if not errors else "partial_success",
+        "results": results,
+        "errors": errors
+    }
+    if read_your_writes:
+        response["read_token"] = encode_read_token(positions)
+    return jsonify(response)
+
+async def simulate_crash_recovery(request):
+    data = await request.json()
+    simulation_case = data['simulationCase']
+    transactions = data.get('transactions', [])
+    node_status = data.get('nodeStatus', {})
+
+    # a node is down if the ui says so or its circuit breaker is open
+    node_up = {node: node_status.get(node, True) and is_up(node) for node in db_config}
+
+    results = []
+    errors = []
+
+    # one at a time in request order, like the flask endpoint: node1 gets the writes in
+    # the same order the replay log stores them, so the recovered node ends up identical
+    for t in transactions:
+        plan = plan_recovery(t, route(t['query']), simulation_case, node_up)
+        if plan["error"]:
+            errors.append({"transaction_id": t['id'], "error": plan["error"]})
+            continue
+        message = f"Query was run on {plan['node']}." if plan["on_node"] else None
+        result = await run_transaction(t, plan["node"], message=message)
+        result.pop('position', None)
+        results.append(result)
+        if plan["stash"]:
+            replay_logs[plan["stash"]].append(t)  # Stash the transaction in the node's replay log
+
+    # stashed writes are on disk before we answer
+    for log in replay_logs.values():
+        await asyncio.to_thread(log.sync)
+
+    return jsonify({
+        "status": "success" if not errors else "partial_success",
+        "results": results,
+        "errors": errors,
+    })
+
+@asynccontextmanager
+async def lifespan(app):
+    await _open_pools()
+    health_monitor.start()  # background pings feed the circuit breakers and /health
+    yield
+    health_monitor.stop()
+    await _close_pools()
+
+_cors = [Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])]
+
+asgi_app = Starlette(
+    routes=[
+        Route('/simulate', simulate_transactions, methods=['POST', 'OPTIONS'], middleware=_cors),
+        Route('/simulate_crash_recovery', simulate_crash_recovery, methods=['POST', 'OPTIONS'], middleware=_cors),
+        Mount('/', app=WsgiToAsgi(flask_app))
+    ],
+    lifespan=lifespan
+)
@@ -1,26 +1,305 @@
+import threading
+import time
+from collections import OrderedDict
+
 import mysql.connector
+from mysql.connector import errors
+
+# node addresses and fragment placement live in topology.py (outside the app package)
+from topology import central_node, db_config, fragment_config
 
-db_config = {
-    "node1": {"host": "localhost", "port": 3306, "user": "replication_user", "password": " ", "database": "justgames"}, # change pw into ur own
-    "node2": {"host": "localhost", "port": 3307, "user": "replication_user", "password": " ", "database": "justgames"}, # change pw into ur own
-    "node3": {"host": "localhost", "port": 3308, "user": "replication_user", "password": " ", "database": "justgames"}  # change pw into ur own
+pool_config = {
+    "size": 8,                               # max open connections per node
+    "checkout_timeout": 10,                  # seconds to wait for a free connection
+    "connect_timeout": 5,                    # seconds for a new tcp connect / handshake
+    "default_isolation": "REPEATABLE READ",  # session isolation restored on every checkout
+    "statement_cache_size": 32               # prepared statements kept open per connection
 }
 
-def get_db_connection(node):
+ISOLATION_LEVELS = ("READ UNCOMMITTED", "READ COMMITTED", "REPEATABLE READ", "SERIALIZABLE")
+
+def normalize_isolation(level):
+    # isolation levels are keywords and can't be sent as parameters, so only
+    # these four ever make it into the SET TRANSACTION text
+    normalized = " ".join(str(level).replace("-", " ").split()).upper()
+    if normalized not in ISOLATION_LEVELS:
+        raise ValueError(f"Unknown isolation level: {level}")
+    return normalized
+
+def _connect(node):
     return mysql.connector.connect(
         host=db_config[node]["host"],
-        port=db_config[node]["port"],  
+        port=db_config[node]["port"],
         user=db_config[node]["user"],
         password=db_config[node]["password"],
-        database=db_config[node]["database"]
+        database=db_config[node]["database"],
+        connection_timeout=pool_config["connect_timeout"]
     )
 
-def execute_query(node, query):
+class PreparedStatement:
+    def __init__(self, cursor, query):
+        self.cursor = cursor
+        self.query = query
+
+    def execute(self, params=()):
+        # returns the cursor to fetch from, it stays open for the next borrower
+        self.cursor.execute(self.query, tuple(params))
+        return self.cursor
+
+class StatementCache:
+    # server-side prepared statements of one connection, by sql text. a statement stays
+    # prepared until its cursor is closed, so repeats skip the parse and plan.
+    # the least recently used are closed once there are more than `size`
+
+    def __init__(self, pool, size):
+        self._pool = pool
+        self.size = size
+        self._statements = OrderedDict()
+
+    def get(self, connection, query):
+        statement = self._statements.get(query)
+        if statement is not None:
+            self._statements.move_to_end(query)
+            self._pool._count("statement_hits")
+            return statement
+        # the cursor only skips re-preparing when it is handed the very same str object,
+        # so the statement keeps the one it was prepared with
+        statement = PreparedStatement(connection.cursor(prepared=True, dictionary=True), query)
+        self._statements[query] = statement
+        self._pool._count("statements_prepared")
+        while len(self._statements) > self.size:
+            _, evicted = self._statements.popitem(last=False)
+            self._pool._count("statement_evictions")
+            try:
+                evicted.cursor.close()
+            except Exception:
+                pass
+        return statement
+
+class PooledConnection:
+    # thin wrapper around a mysql connection: close() hands it back to the pool
+    # instead of tearing down the socket, everything else is passed through
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        self._session_changed = False
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise errors.InterfaceError("Connection was already returned to the pool")
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+            return
+        # e.g. connection.autocommit = True: the next borrower gets the session reset
+        self._session_changed = True
+        setattr(self._connection, name, value)
+
+    def session_changed(self):
+        # the borrower ran something that may outlive its transaction (SET SESSION ...)
+        self._session_changed = True
+
+    def prepare(self, query):
+        # cached prepared statement for `query` (%s placeholders), shared by everyone
+        # who borrows this connection
+        if self._connection is None:
+            raise errors.InterfaceError("Connection was already returned to the pool")
+        return self._pool.statements(self._connection).get(self._connection, query)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection, self._session_changed)
+
+class NodePool:
+    def __init__(self, node, size):
+        self.node = node
+        self.size = size
+        self._idle = []  # most recently returned last, handed out first
+        self._lock = threading.Lock()
+        # notified whenever a connection comes back or a slot frees up
+        self._available = threading.Condition(self._lock)
+        self._open = 0
+        self._statements = {}  # id(connection) -> StatementCache, dropped with the connection
+        self._needs_reset = set()  # ids of connections whose session settings may be off
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "wait_seconds": 0.0,
+            "statements_prepared": 0,
+            "statement_hits": 0,
+            "statement_evictions": 0
+        }
+
+    def acquire(self, timeout=None):
+        timeout = pool_config["checkout_timeout"] if timeout is None else timeout
+        started = time.monotonic()
+
+        while True:
+            connection = None
+            with self._available:
+                while True:
+                    if self._idle:
+                        connection = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        self._open += 1  # slot taken, connect outside the lock
+                        break
+                    # pool is at capacity, wait for someone to give a connection back
+                    # (or for a broken one to be dropped, which frees a slot)
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise errors.PoolError(f"Timed out waiting for a connection to {self.node}")
+                    self._available.wait(remaining)
+
+            fresh = connection is None
+            if fresh:
+                connection = self._open_new()
+
+            if self._reset(connection, fresh):
+                with self._lock:
+                    self._stats["checkouts"] += 1
+                    if not fresh:
+                        self._stats["reused"] += 1
+                    self._stats["wait_seconds"] += time.monotonic() - started
+                return PooledConnection(self, connection)
+
+    def release(self, connection, session_changed=False):
+        if connection.unread_result:
+            # an abandoned unbuffered result (e.g. an export cut short) could be huge,
+            # closing the socket is cheaper than reading the rest of it
+            self._discard(connection)
+            return
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        with self._available:
+            if session_changed:
+                self._needs_reset.add(id(connection))
+            self._idle.append(connection)
+            self._available.notify()
+
+    def statements(self, connection):
+        with self._lock:
+            cache = self._statements.get(id(connection))
+            if cache is None:
+                cache = self._statements[id(connection)] = StatementCache(self, pool_config["statement_cache_size"])
+            return cache
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _open_new(self):
+        # the caller already holds a slot in self._open
+        try:
+            connection = _connect(self.node)
+        except Exception:
+            with self._available:
+                self._open -= 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self._stats["created"] += 1
+        return connection
+
+    def _reset(self, connection, fresh):
+        # health check + reset before handing the connection out: drop anything a previous
+        # borrower left open. session settings are only sent again for a new connection or
+        # one whose borrower changed them, a clean checkout costs just the ping
+        with self._lock:
+            needs_reset = fresh or id(connection) in self._needs_reset
+        try:
+            connection.ping(reconnect=False)
+            if connection.in_transaction:
+                connection.rollback()
+            if needs_reset:
+                connection.autocommit = False
+                cursor = connection.cursor()
+                cursor.execute(f"SET SESSION TRANSACTION ISOLATION LEVEL {pool_config['default_isolation']};")
+                cursor.close()
+                with self._lock:
+                    self._needs_reset.discard(id(connection))
+            return True
+        except Exception as e:
+            print(f"Discarding broken connection to {self.node}: {e}")
+            self._discard(connection)
+            return False
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._available:
+            # the server forgets a connection's prepared statements with it
+            self._statements.pop(id(connection), None)
+            self._needs_reset.discard(id(connection))
+            self._open -= 1
+            self._stats["discarded"] += 1
+            self._available.notify()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = self._open
+            stats["idle"] = len(self._idle)
+        stats["in_use"] = stats["open"] - stats["idle"]
+        stats["size"] = self.size
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._discard(connection)
+
+pools = {node: NodePool(node, pool_config["size"]) for node in db_config}
+
+def get_db_connection(node):
+    # borrow a connection from the node's pool, connection.close() returns it
+    return pools[node].acquire()
+
+def open_unpooled_connection(node):
+    # a connection of its own, for a long stream (export) that would otherwise hold a
+    # pooled one for minutes. connection.close() really closes it
+    return _connect(node)
+
+def get_pool_stats():
+    return {node: pool.stats() for node, pool in pools.items()}
+
+def execute_statement(connection, cursor, query, params=None):
+    # plain sql goes over the text protocol on `cursor`; with params it runs as a cached
+    # server-side prepared statement and the values never become part of the sql.
+    # returns the cursor to fetch results from
+    if query.lstrip()[:3].upper() == "SET":
+        connection.session_changed()
+    if params is None:
+        cursor.execute(query)
+        return cursor
+    return connection.prepare(query).execute(params)
+
+def execute_query(node, query, params=None):
     connection = get_db_connection(node)
     cursor = connection.cursor(dictionary=True)  # `dictionary=True` to get results as dictionaries
     try:
-        cursor.execute(query)
-        results = cursor.fetchall()
+        results = execute_statement(connection, cursor, query, params).fetchall()
         return results
     except Exception as e:
         print(f"Error executing query: {e}")
@@ -28,4 +307,3 @@ def execute_query(node, query):
     finally:
         cursor.close()
         connection.close()
-
@@ -0,0 +1,96 @@
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.db_config import db_config, pool_config
+
+executor_config = {
+    "workers_per_node": pool_config["size"],  # never more workers than pooled connections
+    "max_pending_per_node": 128,              # queued + running transactions before we push back
+    "retry_after": 1                          # seconds, sent with 429/503 responses
+}
+
+class ExecutorBusyError(Exception):
+    # raised when a node's queue is full, the route turns this into a 429
+    status_code = 429
+
+class BatchTooLargeError(Exception):
+    # raised when one request alone sends a node more than max_pending_per_node
+    # transactions: retrying can never succeed, the route turns this into a 413
+    status_code = 413
+
+class ExecutorShutdownError(Exception):
+    # raised once shutdown has started, the route turns this into a 503
+    status_code = 503
+
+class TransactionExecutor:
+    # one long-lived thread pool per node, shared by every request.
+    # the work is mostly waiting on mysql (locks, DO SLEEP) so threads are enough,
+    # and a pool per node keeps a slow node from eating the workers of the others
+
+    def __init__(self, nodes, workers_per_node, max_pending_per_node, retry_after):
+        self.max_pending_per_node = max_pending_per_node
+        self.retry_after = retry_after
+        self._executors = {
+            node: ThreadPoolExecutor(max_workers=workers_per_node, thread_name_prefix=f"{node}-txn")
+            for node in nodes
+        }
+        self._pending = {node: 0 for node in nodes}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit_batch(self, fn, transactions):
+        # admit the whole batch or none of it, so a rejected request leaves nothing half-run
+        wanted = {}
+        for t in transactions:
+            wanted[t['node']] = wanted.get(t['node'], 0) + 1
+        for node, count in wanted.items():
+            if count > self.max_pending_per_node:
+                raise BatchTooLargeError(
+                    f"{count} transactions for {node}, at most {self.max_pending_per_node} per request"
+                )
+
+        with self._lock:
+            if self._closed:
+                raise ExecutorShutdownError("Server is shutting down")
+            for node, count in wanted.items():
+                if node not in self._executors:
+                    raise KeyError(node)
+                if self._pending[node] + count > self.max_pending_per_node:
+                    raise ExecutorBusyError(f"Too many queued transactions for {node}")
+            for node, count in wanted.items():
+                self._pending[node] += count
+
+        futures = {}
+        for t in transactions:
+            future = self._executors[t['node']].submit(fn, t)
+            future.add_done_callback(lambda _, node=t['node']: self._done(node))
+            futures[future] = t
+        return futures
+
+    def _done(self, node):
+        with self._lock:
+            self._pending[node] -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                node: {"pending": pending, "max_pending": self.max_pending_per_node}
+                for node, pending in self._pending.items()
+            }
+
+    def shutdown(self, wait=True):
+        # stop taking new work, then let in-flight transactions finish
+        with self._lock:
+            self._closed = True
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+
+transaction_executor = TransactionExecutor(
+    db_config.keys(),
+    executor_config["workers_per_node"],
+    executor_config["max_pending_per_node"],
+    executor_config["retry_after"]
+)
+
+atexit.register(transaction_executor.shutdown)
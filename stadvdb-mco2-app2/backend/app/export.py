@@ -0,0 +1,120 @@
+import csv
+import heapq
+import io
+import json
+import threading
+
+from app.db_config import central_node, fragment_config, open_unpooled_connection
+from app.health import is_up, report_failure, report_success
+from app.replication import choose_read_node
+
+export_config = {
+    "chunk_size": 1000,   # rows pulled off the socket per fetchmany
+    "max_concurrent": 4,  # exports streaming at once, each holds one connection per fragment
+    "retry_after": 5      # seconds, sent with the 503 when every export slot is taken
+}
+
+class ExportBusyError(Exception):
+    # raised when max_concurrent exports are already running, the route turns this into a 503
+    status_code = 503
+
+_export_slots = threading.BoundedSemaphore(export_config["max_concurrent"])
+
+def _export_node(fragment, positions):
+    home = fragment_config[fragment]["home"]
+    node = choose_read_node(fragment, positions)
+    if node == home and not is_up(home):
+        node = central_node
+    return node
+
+def _open_fragment(fragment, node, filters, params):
+    # unbuffered cursor: rows stay on the socket until we fetch them, so memory
+    # doesn't grow with the size of the fragment. the connection is not from the pool,
+    # a slow client can't keep pooled connections away from transactions and reads
+    home = fragment_config[fragment]["home"]
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    query = f"SELECT * FROM {fragment} {where} ORDER BY game_id"
+
+    try:
+        connection = open_unpooled_connection(node)
+    except Exception as e:
+        report_failure(node, e)
+        fallback = central_node if node == home else home
+        print(f"Fragment {fragment} unavailable on {node}, exporting from {fallback}: {e}")
+        node = fallback
+        connection = open_unpooled_connection(node)
+    cursor = connection.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(query, tuple(params))
+        report_success(node)
+    except Exception:
+        cursor.close()
+        connection.close()
+        raise
+    return connection, cursor
+
+def _rows(cursor, chunk_size):
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            return
+        yield from chunk
+
+def stream_rows(filters=(), params=(), positions=None, chunk_size=None):
+    # every fragment streamed in game_id order and merged on the fly, one chunk per
+    # fragment in memory at a time. connections are closed when the generator
+    # finishes or is closed early (client disconnected)
+    chunk_size = chunk_size or export_config["chunk_size"]
+    if not _export_slots.acquire(blocking=False):
+        raise ExportBusyError("Too many exports running")
+    opened = []
+    try:
+        # routing first: choose_read_node may borrow a pooled node1 connection to sample
+        # the lag, that must not happen while this export holds connections of its own
+        nodes = {fragment: _export_node(fragment, positions) for fragment in fragment_config}
+        for fragment, node in nodes.items():
+            opened.append(_open_fragment(fragment, node, filters, params))
+        streams = [_rows(cursor, chunk_size) for _, cursor in opened]
+        yield from heapq.merge(*streams, key=lambda row: row["game_id"])
+    finally:
+        for connection, cursor in opened:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            try:
+                connection.close()
+            except Exception:
+                pass
+        _export_slots.release()
+
+def ndjson_lines(rows, chunk_size=None):
+    # one json object per line, sent in batches so each http chunk isn't a single row
+    chunk_size = chunk_size or export_config["chunk_size"]
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, default=str) + "\n")
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+def csv_lines(rows, chunk_size=None):
+    # header from the first row, then rows written in batches
+    chunk_size = chunk_size or export_config["chunk_size"]
+    buffer = io.StringIO()
+    writer = None
+    count = 0
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+            writer.writeheader()
+        writer.writerow(row)
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.getvalue():
+        yield buffer.getvalue()
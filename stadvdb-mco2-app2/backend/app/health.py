@@ -0,0 +1,208 @@
+import threading
+import time
+
+import mysql.connector
+from mysql.connector.errors import InterfaceError, OperationalError
+
+from app.db_config import db_config
+
+health_config = {
+    "interval": 2,            # seconds between pings of every node
+    "ping_timeout": 2,        # seconds, connect timeout for the monitor's own connections
+    "failure_threshold": 3,   # consecutive failures that open the breaker
+    "open_seconds": 10,       # how long an open breaker rejects before trying again
+    "half_open_trials": 1     # requests let through while half-open
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    # closed: requests go through, failures are counted
+    # open: requests are refused straight away until open_seconds have passed
+    # half_open: a few trial requests (and the monitor's pings) decide whether to close again
+
+    def __init__(self, node, failure_threshold, open_seconds, half_open_trials):
+        self.node = node
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_trials = half_open_trials
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.trials = 0
+        self.last_error = None
+        self.last_checked = None
+        self.latency_ms = None
+        self.avg_latency_ms = None
+
+    def _maybe_half_open(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.trials = 0
+
+    def allow_request(self):
+        with self._lock:
+            self._maybe_half_open()
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.trials < self.half_open_trials:
+                self.trials += 1
+                return True
+            return False
+
+    def record_success(self, latency_ms=None):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self.opened_at = None
+            self.last_checked = time.time()
+            if latency_ms is not None:
+                self.latency_ms = latency_ms
+                # moving average so one slow ping doesn't dominate
+                self.avg_latency_ms = latency_ms if self.avg_latency_ms is None else 0.8 * self.avg_latency_ms + 0.2 * latency_ms
+
+    def record_failure(self, error):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self.last_error = str(error)
+            self.last_checked = time.time()
+            self._maybe_half_open()
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"Circuit for {self.node} is now open: {error}")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self.state,
+                "latency_ms": self.latency_ms,
+                "avg_latency_ms": self.avg_latency_ms,
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "last_error": self.last_error,
+                "last_checked": self.last_checked
+            }
+
+breakers = {
+    node: CircuitBreaker(
+        node,
+        health_config["failure_threshold"],
+        health_config["open_seconds"],
+        health_config["half_open_trials"]
+    )
+    for node in db_config
+}
+
+def is_available(node):
+    # cheap check before a transaction is sent, never touches the network. takes one of
+    # the half-open trials, so routing decisions that don't send anything use is_up
+    breaker = breakers.get(node)
+    return breaker is None or breaker.allow_request()
+
+def is_up(node):
+    # like is_available but doesn't use up a half-open trial, for status views and routing
+    breaker = breakers.get(node)
+    return breaker is None or breaker.snapshot()["state"] != OPEN
+
+# client-side "can't reach / lost the server" codes, the same for mysql.connector and pymysql
+CONNECTION_ERRNOS = {2002, 2003, 2005, 2006, 2013, 2055}
+
+def error_code(error):
+    # mysql.connector errors carry .errno, pymysql ones put the code in args[0]
+    code = getattr(error, "errno", None)
+    if code is None and error.args and isinstance(error.args[0], int):
+        code = error.args[0]
+    return code
+
+def is_connection_error(error):
+    code = error_code(error)
+    if code in CONNECTION_ERRNOS:
+        return True
+    if code is None or code == -1:
+        # driver-level failures without a server code (socket gone, timeouts)
+        return isinstance(error, (InterfaceError, OperationalError, OSError, TimeoutError))
+    return False
+
+def report_failure(node, error):
+    # requests feed connection failures back so the breaker doesn't wait for the next ping;
+    # sql errors (deadlocks, syntax, ...) say nothing about the node's health and are ignored
+    if node in breakers and is_connection_error(error):
+        breakers[node].record_failure(error)
+
+def report_success(node):
+    # the node answered a request: it is reachable, so a half-open breaker closes
+    # without waiting for the monitor (which may not be running at all)
+    breaker = breakers.get(node)
+    if breaker is None or (breaker.state == CLOSED and not breaker.consecutive_failures):
+        return
+    breaker.record_success()
+
+class HealthMonitor:
+    # background thread that pings every node on an interval with its own short-timeout
+    # connections (not the pool's), so a dead node is noticed without a request paying for it
+
+    def __init__(self, interval, ping_timeout):
+        self.interval = interval
+        self.ping_timeout = ping_timeout
+        self._connections = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for node in db_config:
+                self.check(node)
+            self._stop.wait(self.interval)
+
+    def check(self, node):
+        started = time.monotonic()
+        try:
+            connection = self._connections.get(node)
+            if connection is None:
+                connection = mysql.connector.connect(
+                    host=db_config[node]["host"],
+                    port=db_config[node]["port"],
+                    user=db_config[node]["user"],
+                    password=db_config[node]["password"],
+                    database=db_config[node]["database"],
+                    connection_timeout=self.ping_timeout
+                )
+                self._connections[node] = connection
+            connection.ping(reconnect=False)
+        except Exception as e:
+            self._drop(node)
+            breakers[node].record_failure(e)
+            return False
+        breakers[node].record_success((time.monotonic() - started) * 1000)
+        return True
+
+    def _drop(self, node):
+        connection = self._connections.pop(node, None)
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+health_monitor = HealthMonitor(health_config["interval"], health_config["ping_timeout"])
+
+def get_health():
+    return {node: breaker.snapshot() for node, breaker in breakers.items()}
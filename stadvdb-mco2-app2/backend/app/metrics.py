@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+
+from app.health import error_code
+
+metrics_config = {
+    # seconds; transactions slower than this are written to the slow-query log (None = off)
+    "slow_query_seconds": None,
+    "slow_query_file": None,  # log file path, None logs to stderr
+    "buckets": (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+}
+
+slow_query_log = logging.getLogger("app.slow_query")
+if metrics_config["slow_query_seconds"] is not None:
+    slow_query_log.setLevel(logging.INFO)
+    handler = (logging.FileHandler(metrics_config["slow_query_file"])
+               if metrics_config["slow_query_file"] else logging.StreamHandler())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_log.addHandler(handler)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, values)} {_number(total)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=metrics_config["buckets"]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, values, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(series['sum'])}")
+                lines.append(f"{self.name}_count{_labels(self.labels, values)} {series['count']}")
+        return lines
+
+class Gauge:
+    # value read at scrape time: callback() -> {label values tuple: number}.
+    # kind="counter" for totals that are kept somewhere else (pool stats, ...)
+    def __init__(self, name, help, labels, callback, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Could not collect {self.name}: {e}")
+            return lines
+        for label_values, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+phase_seconds = Histogram(
+    "db_phase_seconds",
+    "Time spent in each phase of a transaction (connect, set_isolation, begin, statement, sleep, commit, rollback).",
+    ("node", "statement", "phase")
+)
+transaction_seconds = Histogram(
+    "db_transaction_seconds",
+    "End-to-end time of a transaction or read, connection checkout included.",
+    ("node", "statement")
+)
+rows_returned = Counter("db_rows_returned_total", "Rows returned to the caller.", ("node", "statement"))
+rollbacks = Counter("db_rollbacks_total", "Transactions rolled back, by reason (requested or error).", ("node", "reason"))
+errors = Counter("db_errors_total", "Failed statements by mysql error code.", ("node", "code"))
+retries = Counter("db_retries_total", "Transactions retried after a deadlock or lock wait timeout.", ("node", "code"))
+
+_registry = [phase_seconds, transaction_seconds, rows_returned, rollbacks, errors, retries]
+
+def register_gauge(name, help, labels, callback, kind="gauge"):
+    _registry.append(Gauge(name, help, labels, callback, kind))
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class PhaseTimer:
+    # times one transaction: call mark(phase) right after each step finishes,
+    # finish() once at the end records the total and the slow-query log entry
+    def __init__(self, node, statement):
+        self.node = node
+        self.statement = statement
+        self.started = self._last = time.perf_counter()
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.phases[phase] = self.phases.get(phase, 0) + elapsed
+        phase_seconds.observe(elapsed, self.node, self.statement, phase)
+
+    def rows(self, count):
+        if count:
+            rows_returned.inc(self.node, self.statement, amount=count)
+
+    def rollback(self, reason):
+        rollbacks.inc(self.node, reason)
+
+    def error(self, error):
+        # mysql errno, or the exception class for errors that never reached the server
+        code = error_code(error)
+        errors.inc(self.node, str(code) if code is not None else type(error).__name__)
+
+    def finish(self, query=None):
+        total = time.perf_counter() - self.started
+        transaction_seconds.observe(total, self.node, self.statement)
+        threshold = metrics_config["slow_query_seconds"]
+        if threshold is not None and total >= threshold:
+            phases = " ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in self.phases.items())
+            slow_query_log.info(f"{total * 1000:.1f}ms node={self.node} {phases} query={' '.join((query or '').split())}")
+        return total
@@ -0,0 +1,68 @@
+import base64
+import json
+import threading
+from collections import OrderedDict
+
+page_index_config = {
+    "size": 256,               # searches (filters + page size) whose page boundaries are kept
+    "pages_per_search": 1000,  # boundaries kept per search, oldest go first
+    "max_prefix_pages": 5      # further than this from a known page, node1 looks the boundary up
+}
+
+def encode_cursor(direction, game_id):
+    # opaque page token, the client just hands it back as ?cursor=
+    raw = json.dumps({"d": direction, "k": game_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = data["d"]
+        game_id = data["k"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if direction not in ("next", "prev"):
+        raise ValueError("Invalid cursor")
+    return direction, game_id
+
+class PageIndex:
+    # where pages we have already served start: page N begins right after the stored
+    # game_id, so jumping to a page we have seen (or one just past it) is a keyset seek
+    # instead of reading every page before it. entries are tagged with the result
+    # cache generations, any write to a fragment makes them stale
+
+    def __init__(self, size, pages_per_search):
+        self.size = size
+        self.pages_per_search = pages_per_search
+        self._entries = OrderedDict()  # search key -> {"generation", "starts": {page: game_id}}
+        self._lock = threading.Lock()
+
+    def nearest(self, key, page, generation):
+        # (page, boundary) of the closest known page at or before `page`, (1, None) if none
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["generation"] != generation:
+                return 1, None
+            self._entries.move_to_end(key)
+            known = [p for p in entry["starts"] if p <= page]
+            if not known:
+                return 1, None
+            best = max(known)
+            return best, entry["starts"][best]
+
+    def put(self, key, page, boundary, generation):
+        if page <= 1 or boundary is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["generation"] != generation:
+                entry = self._entries[key] = {"generation": generation, "starts": {}}
+            entry["starts"][page] = boundary
+            while len(entry["starts"]) > self.pages_per_search:
+                del entry["starts"][next(iter(entry["starts"]))]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+page_index = PageIndex(page_index_config["size"], page_index_config["pages_per_search"])
@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mysql.connector.errors import DataError, IntegrityError, NotSupportedError, ProgrammingError
+
+from app.db_config import execute_statement, get_db_connection, normalize_isolation
+from app.replication import capture_position
+from app.result_cache import invalidate_write
+from app.retry import Retry
+from app.router import route
+
+replay_config = {
+    "directory": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "replay_log"),
+    "nodes": ["node2", "node3"],        # nodes whose writes get stashed while they are down
+    "fsync_every": 64,                  # appended records per fsync (sync() forces one at request end)
+    "batch_size": 200,                  # statements per replay transaction
+    "max_parallel_nodes": 2,            # nodes replayed at the same time
+    "applied_table": "replay_applied"   # on each node: highest seq of its log committed there
+}
+
+def idempotency_key(t):
+    # only a key the client sends itself dedupes. transaction ids restart at 1 in every
+    # request, so the same write sent twice is two writes and both must be replayed
+    if t.get('idempotency_key'):
+        return str(t['idempotency_key'])
+    return None
+
+class ReplayLog:
+    # append-only log of writes a node missed while it was down, one per node.
+    #   <node>.log         one json record per line: {"seq", "key", "transaction"}
+    #   <node>.checkpoint  highest seq that has been committed on the node
+    #   <node>.rejected    records the node refused (bad sql etc.), kept for inspection
+    # replay is exactly-once: the node records the last seq it applied in the same
+    # transaction as the batch, so a crash between commit and checkpoint skips that batch
+
+    def __init__(self, node, directory):
+        self.node = node
+        self.log_path = os.path.join(directory, f"{node}.log")
+        self.checkpoint_path = os.path.join(directory, f"{node}.checkpoint")
+        self.rejected_path = os.path.join(directory, f"{node}.rejected")
+        self._lock = threading.Lock()
+        self.replay_lock = threading.Lock()
+        self._unsynced = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._checkpoint = self._read_checkpoint()
+        self._next_seq = self._checkpoint + 1
+        self._pending_keys = set()
+        for record in self._read_records():
+            self._next_seq = max(self._next_seq, record["seq"] + 1)
+            if record["seq"] > self._checkpoint:
+                self._pending_keys.add(record["key"])
+        self._file = open(self.log_path, "a", encoding="utf-8")
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)["seq"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+
+    def _read_records(self):
+        try:
+            with open(self.log_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # torn last line from a crash mid-append, it was never acknowledged
+                        continue
+        except FileNotFoundError:
+            return
+
+    def append(self, t):
+        # returns the record's seq, or None if a write with the same client key is already waiting
+        key = idempotency_key(t)
+        with self._lock:
+            if key is not None and key in self._pending_keys:
+                return None
+            seq = self._next_seq
+            self._next_seq += 1
+            if key is None:
+                key = f"seq:{seq}"
+            self._file.write(json.dumps({"seq": seq, "key": key, "transaction": t}) + "\n")
+            self._pending_keys.add(key)
+            self._unsynced += 1
+            if self._unsynced >= replay_config["fsync_every"]:
+                self._sync_locked()
+            return seq
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def pending(self):
+        with self._lock:
+            self._sync_locked()
+            checkpoint = self._checkpoint
+        return [record for record in self._read_records() if record["seq"] > checkpoint]
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending_keys)
+
+    def checkpoint(self, records):
+        # make the batch's progress durable before forgetting its keys
+        seq = records[-1]["seq"]
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"seq": seq, "at": time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        with self._lock:
+            self._checkpoint = seq
+            for record in records:
+                self._pending_keys.discard(record["key"])
+
+    def reject(self, record, error):
+        with open(self.rejected_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"record": record, "error": error, "at": time.time()}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        # everything up to the checkpoint is applied, drop it from the log
+        with self._lock:
+            self._sync_locked()
+            checkpoint = self._checkpoint
+            keep = [record for record in self._read_records() if record["seq"] > checkpoint]
+            tmp_path = self.log_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in keep:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.log_path)
+            self._file = open(self.log_path, "a", encoding="utf-8")
+
+def _batches(records):
+    # consecutive records with the same isolation level, at most batch_size each
+    batch = []
+    for record in records:
+        isolation = record["transaction"].get('isolation', 'READ COMMITTED')
+        if batch and (len(batch) >= replay_config["batch_size"]
+                      or batch[0]["transaction"].get('isolation', 'READ COMMITTED') != isolation):
+            yield batch
+            batch = []
+        batch.append(record)
+    if batch:
+        yield batch
+
+_applied_tables = set()  # nodes where the applied table is known to exist
+
+def _applied_seq(node):
+    # highest seq of the node's log that the node itself has committed
+    table = replay_config["applied_table"]
+    connection = get_db_connection(node)
+    cursor = connection.cursor()
+    try:
+        if node not in _applied_tables:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} (log VARCHAR(64) PRIMARY KEY, seq BIGINT NOT NULL)")
+            _applied_tables.add(node)
+        cursor.execute(f"SELECT seq FROM {table} WHERE log = %s", (node,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    finally:
+        cursor.close()
+        connection.close()
+
+def _apply(node, records):
+    # run records as a single transaction on the node, their last seq is committed with them.
+    # returns the node's binlog position after the commit
+    isolation_level = records[0]["transaction"].get('isolation', 'READ COMMITTED')
+    connection = get_db_connection(node)
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {normalize_isolation(isolation_level)};")
+        cursor.execute("START TRANSACTION;")
+        for record in records:
+            t = record["transaction"]
+            statement = execute_statement(connection, cursor, t["query"], t.get('params'))
+            if statement.with_rows:
+                statement.fetchall()
+        cursor.execute(
+            f"INSERT INTO {replay_config['applied_table']} (log, seq) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE seq = VALUES(seq)",
+            (node, records[-1]["seq"])
+        )
+        connection.commit()
+        return capture_position(cursor)
+    except Exception:
+        try:
+            connection.rollback()
+        except Exception:
+            pass  # connection is gone, the pool drops it on close()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+def _apply_retrying(node, records):
+    # a deadlock or lock wait timeout rolls the batch back on the node, it usually goes
+    # through when run again. once the retries run out the error stops the replay
+    retry = Retry(node)
+    while True:
+        time.sleep(retry.backoff())
+        try:
+            return _apply(node, records)
+        except Exception as e:
+            if not retry.should_retry(e):
+                raise
+
+def _invalidate(node, records, position):
+    # replayed writes change the fragments they touch, cached reads of those go
+    for record in records:
+        invalidate_write(route(record["transaction"]["query"]), node, position)
+
+def _bad_statement(e):
+    # the server refused the statement itself (syntax, constraint, bad value, ...) or the
+    # record can't be turned into sql (unknown isolation level). anything else, connection
+    # problems, deadlocks and lock wait timeouts included, stops the node's replay and
+    # keeps the record pending
+    return isinstance(e, (ValueError, ProgrammingError, IntegrityError, DataError, NotSupportedError))
+
+def _result(node, record, error=None):
+    t = record["transaction"]
+    result = {
+        "transaction_id": t.get('id'),
+        "node": node,
+        "query": t['query'],
+        "seq": record["seq"]
+    }
+    if error is None:
+        result["result"] = None
+    else:
+        result["error"] = error
+    return result
+
+def replay_node(log):
+    results = []
+    errors = []
+    applied = 0
+
+    # one replay per node at a time, a second caller just finds nothing pending
+    with log.replay_lock:
+        pending = log.pending()
+        try:
+            applied_seq = _applied_seq(log.node)
+        except Exception as e:
+            errors.append({"node": log.node, "error": str(e)})
+            return {"node": log.node, "applied": applied, "results": results, "errors": errors}
+
+        # committed on the node by an earlier replay that died before its checkpoint
+        done = [record for record in pending if record["seq"] <= applied_seq]
+        if done:
+            log.checkpoint(done)
+        pending = [record for record in pending if record["seq"] > applied_seq]
+
+        for batch in _batches(pending):
+            try:
+                _invalidate(log.node, batch, _apply_retrying(log.node, batch))
+                log.checkpoint(batch)
+                applied += len(batch)
+                results.extend(_result(log.node, record) for record in batch)
+                continue
+            except Exception as e:
+                if not _bad_statement(e):
+                    errors.append({"node": log.node, "error": str(e)})
+                    break
+
+            # the batch hit a bad statement: apply one by one so only that one is set aside
+            stopped = False
+            for record in batch:
+                try:
+                    _invalidate(log.node, [record], _apply_retrying(log.node, [record]))
+                    applied += 1
+                    results.append(_result(log.node, record))
+                except Exception as e:
+                    if not _bad_statement(e):
+                        errors.append({"node": log.node, "error": str(e)})
+                        stopped = True
+                        break
+                    log.reject(record, str(e))
+                    errors.append(_result(log.node, record, str(e)))
+                log.checkpoint([record])
+            if stopped:
+                break
+
+        if not log.pending_count():
+            log.compact()
+
+    return {"node": log.node, "applied": applied, "results": results, "errors": errors}
+
+def replay(logs):
+    # nodes are independent, so they are replayed side by side
+    with ThreadPoolExecutor(max_workers=replay_config["max_parallel_nodes"]) as pool:
+        return list(pool.map(replay_node, logs))
+
+replay_logs = {node: ReplayLog(node, replay_config["directory"]) for node in replay_config["nodes"]}
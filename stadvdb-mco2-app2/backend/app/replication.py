@@ -0,0 +1,143 @@
+import base64
+import json
+import threading
+import time
+
+from app.db_config import central_node, fragment_config, get_db_connection
+from app.health import is_up
+
+replication_config = {
+    "max_lag_seconds": 5,        # node1 serves a fragment's reads while its channel is under this
+    "sample_ttl": 1.0,           # seconds a SHOW SLAVE STATUS sample is reused
+    "prefer_central_reads": True,
+    # replication channel on node1 -> node it replicates from (see the README setup)
+    "channels": {"node2-update": "node2", "node3-update": "node3"}
+}
+
+_source_channels = {node: channel for channel, node in replication_config["channels"].items()}
+
+class LagMonitor:
+    # per-channel replication status of node1, sampled lazily and cached for sample_ttl.
+    # only one request refreshes at a time, the others keep using the previous sample
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._channels = {}
+        self._sampled_at = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def channels(self):
+        with self._lock:
+            fresh = self._sampled_at is not None and time.monotonic() - self._sampled_at < self.ttl
+            if fresh or self._refreshing:
+                return self._channels
+            self._refreshing = True
+
+        channels = {}
+        error = None
+        try:
+            channels = self._sample()
+        except Exception as e:
+            # no REPLICATION CLIENT grant, node1 down, ...: lag unknown, reads go home
+            error = str(e)
+        with self._lock:
+            self._channels = channels
+            self._error = error
+            self._sampled_at = time.monotonic()
+            self._refreshing = False
+            return channels
+
+    def _sample(self):
+        connection = get_db_connection(central_node)
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SHOW SLAVE STATUS;")
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+
+        channels = {}
+        for row in rows:
+            channels[row.get("Channel_Name", "")] = {
+                "seconds_behind": row.get("Seconds_Behind_Master"),
+                "running": row.get("Slave_IO_Running") == "Yes" and row.get("Slave_SQL_Running") == "Yes",
+                "executed": [row.get("Relay_Master_Log_File"), row.get("Exec_Master_Log_Pos")]
+            }
+        return channels
+
+    def status(self):
+        channels = self.channels()
+        with self._lock:
+            sampled_at = self._sampled_at
+            error = self._error
+        return {
+            "channels": channels,
+            "age_seconds": None if sampled_at is None else time.monotonic() - sampled_at,
+            "error": error,
+            "max_lag_seconds": replication_config["max_lag_seconds"]
+        }
+
+lag_monitor = LagMonitor(replication_config["sample_ttl"])
+
+def encode_read_token(positions):
+    # positions: {node: [binlog file, position]} of the client's latest writes
+    raw = json.dumps(positions, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_read_token(token):
+    if not token:
+        return {}
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        positions = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {node: (str(p[0]), int(p[1])) for node, p in positions.items()}
+    except Exception:
+        raise ValueError("Invalid read token")
+
+def merge_positions(positions, node, position):
+    # keep the furthest position per node
+    if position is None:
+        return positions
+    current = positions.get(node)
+    if current is None or tuple(position) > tuple(current):
+        positions[node] = list(position)
+    return positions
+
+def capture_position(cursor):
+    # binlog position right after our commit on a source node; node1 has applied our
+    # write once its channel has executed up to here
+    try:
+        cursor.execute("SHOW MASTER STATUS;")
+        row = cursor.fetchone()
+    except Exception as e:
+        print(f"Could not read binlog position: {e}")
+        return None
+    if not row:
+        return None
+    return [row["File"], row["Position"]]
+
+def central_is_fresh(fragment, positions=None):
+    channel = _source_channels.get(fragment_config[fragment]["home"])
+    status = lag_monitor.channels().get(channel)
+    if status is None or not status["running"]:
+        return False
+    if status["seconds_behind"] is None or status["seconds_behind"] > replication_config["max_lag_seconds"]:
+        return False
+
+    # read-your-writes: node1 must have executed past the client's last write on the source
+    wanted = (positions or {}).get(fragment_config[fragment]["home"])
+    if wanted is not None:
+        executed = status["executed"]
+        if executed[0] is None or (executed[0], executed[1] or 0) < tuple(wanted):
+            return False
+    return True
+
+def choose_read_node(fragment, positions=None):
+    # node1 while it is caught up enough, the fragment's home node otherwise
+    home = fragment_config[fragment]["home"]
+    if not replication_config["prefer_central_reads"] or not is_up(central_node):
+        return home
+    return central_node if central_is_fresh(fragment, positions) else home
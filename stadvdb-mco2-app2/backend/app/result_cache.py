@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from app.db_config import central_node, fragment_config
+from app.router import normalize
+
+result_cache_config = {
+    "size": 1024,               # entries kept, least recently used go first
+    "ttl": 30,                  # seconds, backstop for writes made outside this backend
+    "max_rows_per_entry": 5000  # bigger results (deep page jumps) aren't worth the memory
+}
+
+class ResultCache:
+    # rows a fragment returned for a (normalized query, params), tagged with the fragment.
+    # a write drops only the entries of the fragments it touched, and bumps their
+    # generation so a read that was in flight while the write landed is never stored.
+    # node1 only gets a fragment's writes through replication: awaiting() is the home
+    # node's binlog position node1 has to execute before its rows of that fragment are stored
+
+    def __init__(self, size, ttl, max_rows):
+        self.size = size
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # key -> (rows, fragment, stored_at)
+        self._generations = {fragment: 0 for fragment in fragment_config}
+        self._awaiting = {}  # fragment -> (binlog position or None, monotonic time until node1 rows aren't stored)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(fragment, query, params):
+        return (fragment, normalize(query), tuple(params))
+
+    def generation(self, fragment):
+        with self._lock:
+            return self._generations.get(fragment, 0)
+
+    def generations(self):
+        # one number per fragment, changes whenever any fragment is written to
+        with self._lock:
+            return tuple(self._generations[fragment] for fragment in sorted(self._generations))
+
+    def awaiting(self, fragment):
+        with self._lock:
+            return self._awaiting.get(fragment, (None, 0))
+
+    def written(self, fragments, position):
+        # a write committed on the fragments' home node at `position`. None means it
+        # couldn't be read, node1 rows of these fragments aren't stored for a whole ttl
+        with self._lock:
+            for fragment in fragments:
+                awaited, blocked_until = self._awaiting.get(fragment, (None, 0))
+                if position is None:
+                    blocked_until = time.monotonic() + self.ttl
+                elif awaited is None or tuple(position) > tuple(awaited):
+                    awaited = list(position)
+                self._awaiting[fragment] = (awaited, blocked_until)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            rows, _, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return rows
+
+    def put(self, key, rows, fragment, generation):
+        if len(rows) > self.max_rows:
+            return
+        with self._lock:
+            if generation != self._generations.get(fragment, 0):
+                return
+            self._entries[key] = (rows, fragment, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, fragments=None):
+        # None drops everything
+        with self._lock:
+            fragments = set(self._generations if fragments is None else fragments)
+            for fragment in fragments:
+                self._generations[fragment] = self._generations.get(fragment, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry[1] in fragments]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidated"] += len(stale)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["size"] = self.size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else None
+        return stats
+
+result_cache = ResultCache(
+    result_cache_config["size"],
+    result_cache_config["ttl"],
+    result_cache_config["max_rows_per_entry"]
+)
+
+def invalidate_write(decision, node=None, position=None):
+    # a write went through: drop what it may have changed. a statement we couldn't
+    # find any table in could have touched anything. node and position say where it
+    # was committed (binlog position after the commit) so node1 rows wait for it
+    if decision.fragments:
+        fragments = decision.fragments
+    elif not decision.tables:
+        fragments = list(fragment_config)
+    else:
+        return
+    result_cache.invalidate(fragments)
+    if node is not None and node != central_node:
+        result_cache.written([f for f in fragments if fragment_config[f]["home"] == node], position)
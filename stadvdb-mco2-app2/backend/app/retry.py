@@ -0,0 +1,90 @@
+import random
+import threading
+
+from app.health import error_code
+from app.metrics import register_gauge, retries
+
+retry_config = {
+    "max_attempts": 5,        # tries per transaction, the first one included
+    "base_delay": 0.05,       # seconds, backoff before the first retry, doubled on each one after
+    "max_delay": 1.0,         # seconds, cap on a single backoff
+    "max_wait": 3.0,          # seconds of backoff one transaction may spend in total
+    "budget_ratio": 0.2,      # retries earned per transaction, app-wide
+    "budget_cap": 20          # retries that can be saved up for a burst
+}
+
+# deadlock (the server already rolled the transaction back) and lock wait timeout:
+# the same transaction usually goes through when it is run again
+RETRYABLE_ERRNOS = {1213, 1205}
+
+def is_retryable(error):
+    return error_code(error) in RETRYABLE_ERRNOS
+
+class RetryBudget:
+    # caps retries across the app: every transaction earns a fraction of a retry and
+    # every retry spends a whole one, so a pile-up of deadlocks can't double the load
+
+    def __init__(self, ratio, cap):
+        self.ratio = ratio
+        self.cap = cap
+        self.tokens = cap
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def spend(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+retry_budget = RetryBudget(retry_config["budget_ratio"], retry_config["budget_cap"])
+
+register_gauge("db_retry_budget_tokens", "Retries the app-wide retry budget has left.", (),
+               lambda: {(): retry_budget.tokens})
+
+class Retry:
+    # attempt bookkeeping for one transaction:
+    #   retry = Retry(node)
+    #   while True:
+    #       time.sleep(retry.backoff())  # nothing before the first attempt
+    #       try: ... return {..., **retry.report()}
+    #       except Exception as e:
+    #           if retry.should_retry(e): continue
+    #           return {..., "error": ..., **retry.report()}
+
+    def __init__(self, node, config=retry_config, budget=retry_budget):
+        self.node = node
+        self.config = config
+        self.budget = budget
+        self.attempts = 0
+        self.waited = 0.0
+        self._next_delay = 0.0
+
+    def backoff(self):
+        # delay to sleep before the next attempt, counted as waited
+        self.attempts += 1
+        if self.attempts == 1:
+            self.budget.earn()
+        delay, self._next_delay = self._next_delay, 0.0
+        self.waited += delay
+        return delay
+
+    def should_retry(self, error):
+        if not is_retryable(error) or self.attempts >= self.config["max_attempts"]:
+            return False
+        # full jitter: anywhere between 0 and the exponential cap, so transactions
+        # that deadlocked on each other don't come back at the same moment
+        cap = min(self.config["max_delay"], self.config["base_delay"] * 2 ** (self.attempts - 1))
+        delay = random.uniform(0, cap)
+        if self.waited + delay > self.config["max_wait"] or not self.budget.spend():
+            return False
+        self._next_delay = delay
+        retries.inc(self.node, error_code(error))
+        return True
+
+    def report(self):
+        return {"attempts": self.attempts, "retry_wait_ms": round(self.waited * 1000, 1)}
@@ -0,0 +1,176 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from app.db_config import central_node, fragment_config
+
+router_config = {
+    "cache_size": 2048  # distinct normalized statements whose decisions are memoized
+}
+
+READ_KEYWORDS = {"SELECT", "SHOW", "DESCRIBE", "DESC", "EXPLAIN"}
+WRITE_KEYWORDS = {"INSERT", "UPDATE", "DELETE", "REPLACE"}
+TABLE_KEYWORDS = {"FROM", "JOIN", "UPDATE", "INTO", "TABLE"}
+
+_RouteDecision = namedtuple("RouteDecision", [
+    "kind",           # "read", "write" or "other" (ddl, set, ...)
+    "tables",         # every table the statement names
+    "fragments",      # the subset of tables that are fragments
+    "home_node"       # node that owns the data, None when no single node does
+])
+
+class RouteDecision(_RouteDecision):
+    __slots__ = ()
+
+    @property
+    def is_read(self):
+        return self.kind == "read"
+
+    @property
+    def is_write(self):
+        return self.kind == "write"
+
+_TOKEN = re.compile(r"""
+      (?P<space>\s+)
+    | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+    | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    | (?P<quoted>`(?:[^`]|``)+`)
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<word>[A-Za-z_$][\w$]*)
+    | (?P<op><=>|<=|>=|<>|!=|[=<>(),.;*+\-/%@?])
+""", re.VERBOSE | re.DOTALL)
+
+def tokenize(query):
+    # (kind, value) pairs with whitespace and comments dropped, so keywords inside
+    # strings or comments can't confuse the router the way a substring check can
+    tokens = []
+    position = 0
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if match is None:
+            # something we don't know (unicode operator, stray quote), skip a char
+            position += 1
+            continue
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        value = match.group()
+        if kind == "word":
+            tokens.append(("word", value.upper(), value))
+            continue
+        if kind == "quoted":
+            tokens.append(("name", value[1:-1].replace("``", "`"), value))
+            continue
+        if kind == "string":
+            tokens.append(("string", value[1:-1], value))
+            continue
+        tokens.append((kind, value, value))
+    return tokens
+
+def normalize(query):
+    # collapse runs of blanks but keep line breaks, a `-- comment` ends at the newline
+    query = re.sub(r"[ \t\r\f\v]+", " ", query)
+    query = re.sub(r" ?\n[\s]*", "\n", query)
+    return query.strip().rstrip(";").strip()
+
+_CLAUSE_WORDS = {
+    "WHERE", "SET", "VALUES", "VALUE", "SELECT", "JOIN", "INNER", "LEFT", "RIGHT", "CROSS",
+    "ON", "USING", "GROUP", "ORDER", "LIMIT", "HAVING", "UNION", "FOR", "LOCK", "PARTITION",
+    "STRAIGHT_JOIN", "NATURAL", "OUTER", "WINDOW", "INTO", "DUPLICATE", "FROM"
+}
+
+def _table_name(tokens, i):
+    # reads `name`, `db.name` or `db`.`name` at i, returns (name, next index)
+    if i >= len(tokens) or tokens[i][0] not in ("word", "name"):
+        return None, i
+    name = tokens[i][2] if tokens[i][0] == "word" else tokens[i][1]
+    i += 1
+    if i + 1 < len(tokens) and tokens[i][1] == "." and tokens[i + 1][0] in ("word", "name"):
+        name = tokens[i + 1][2] if tokens[i + 1][0] == "word" else tokens[i + 1][1]
+        i += 2
+    return name, i
+
+def _extract_tables(tokens):
+    tables = []
+    i = 0
+    while i < len(tokens):
+        kind, value, _ = tokens[i]
+        i += 1
+        if kind != "word" or value not in TABLE_KEYWORDS:
+            continue
+        if value == "UPDATE" and i > 1 and tokens[i - 2][1] in ("FOR", "KEY"):
+            continue  # SELECT ... FOR UPDATE / ON DUPLICATE KEY UPDATE, not a table
+        # FROM a, b JOIN c ... : keep reading comma separated names (skipping aliases)
+        while True:
+            name, i = _table_name(tokens, i)
+            if name is None:
+                break
+            tables.append(name)
+            while i < len(tokens) and tokens[i][0] in ("word", "name") and tokens[i][1] not in _CLAUSE_WORDS:
+                i += 1  # alias, with or without AS
+            if i < len(tokens) and tokens[i][1] == ",":
+                i += 1
+                continue
+            break
+    seen = []
+    for table in tables:
+        if table.lower() not in seen:
+            seen.append(table.lower())
+    return tuple(seen)
+
+def _classify(tokens):
+    for kind, value, _ in tokens:
+        if kind == "op" and value == "(":
+            continue  # (SELECT ...) UNION (SELECT ...)
+        if kind != "word":
+            return "other"
+        if value in READ_KEYWORDS:
+            return "read"
+        if value in WRITE_KEYWORDS:
+            return "write"
+        if value == "WITH":
+            # cte: whatever statement follows the definitions decides
+            depth = 0
+            for k, v, _ in tokens[1:]:
+                if v == "(":
+                    depth += 1
+                elif v == ")":
+                    depth -= 1
+                elif depth == 0 and k == "word" and v in READ_KEYWORDS | WRITE_KEYWORDS:
+                    return "read" if v in READ_KEYWORDS else "write"
+        return "other"
+    return "other"
+
+def hosts(node, fragment):
+    # node1 holds a replica of every fragment, the others only their own
+    return node == central_node or fragment_config[fragment]["home"] == node
+
+@lru_cache(maxsize=router_config["cache_size"])
+def _route_normalized(statement):
+    tokens = tokenize(statement)
+    kind = _classify(tokens)
+    tables = _extract_tables(tokens)
+    fragments = tuple(t for t in tables if t in fragment_config)
+
+    if len(fragments) == 1:
+        home_node = fragment_config[fragments[0]]["home"]
+    elif kind == "read":
+        # spans both fragments (or none), only the central node has everything
+        home_node = central_node
+    else:
+        home_node = None
+
+    return RouteDecision(kind=kind, tables=tables, fragments=fragments, home_node=home_node)
+
+def route(query):
+    # parse once per distinct statement, hot statements come straight from the cache
+    return _route_normalized(normalize(query))
+
+def misrouted(decision, node):
+    # fragments the statement touches that `node` doesn't hold
+    return [fragment for fragment in decision.fragments if not hosts(node, fragment)]
+
+def route_cache_info():
+    # hits/misses/currsize of the decision cache, shown by /cache_stats
+    return _route_normalized.cache_info()._asdict()
@@ -1,188 +1,425 @@
-from flask import jsonify, request
+from flask import Response, jsonify, request, stream_with_context
 from app import app  
-from app.db_config import get_db_connection
-from concurrent.futures import ProcessPoolExecutor, as_completed
-import multiprocessing
-
-multiprocessing.set_start_method('spawn', force=True)
+from app.db_config import central_node, db_config, execute_statement, get_db_connection, get_pool_stats, normalize_isolation
+from app.executor import transaction_executor, BatchTooLargeError, ExecutorBusyError, ExecutorShutdownError
+from app.export import ExportBusyError, csv_lines, ndjson_lines, export_config, stream_rows
+from app.health import get_health, health_monitor, is_available, is_up, report_failure, report_success
+from app.metrics import PhaseTimer, register_gauge, render as render_metrics
+from app.pagination import decode_cursor, encode_cursor, page_index, page_index_config
+from app.replay_log import replay, replay_logs
+from app.replication import capture_position, decode_read_token, encode_read_token, lag_monitor, merge_positions
+from app.result_cache import invalidate_write, result_cache
+from app.retry import Retry
+from app.router import misrouted, route, route_cache_info
+from app.scatter import gather_aggregate, gather_sorted, seek_boundary
+from concurrent.futures import as_completed
+from itertools import chain
+from time import sleep
+
+@app.before_request
+def start_health_monitor():
+    # under flask run or a wsgi server nothing else starts the pings; the first request
+    # does (once), importing the app still starts no threads
+    health_monitor.start()
 
 @app.route('/simulate', methods=['POST'])
 def simulate_transactions():
     data = request.json
     transactions = data.get('transactions', [])
+    read_your_writes = bool(data.get('read_your_writes'))
+
+    try:
+        positions = decode_read_token(data.get('read_token'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     results = []
     errors = []
 
-    # for parallel execution of transactions
-    with ProcessPoolExecutor() as executor:
-        futures = {}
-        for t in transactions:
-            # submit each transaction for processing in separate processes
-            futures[executor.submit(concurrency_transaction, t)] = t
-
-        for future in as_completed(futures):
-            result = future.result()  # wait for each future to complete
-            transaction = futures[future]
-            if 'error' in result:
-                errors.append(result)
-            else:
-                results.append(result)
+    # transactions aimed at a node we don't know about fail straight away
+    runnable = []
+    for t in transactions:
+        if t.get('node') in db_config:
+            runnable.append(dict(t, read_your_writes=True) if read_your_writes else t)
+        else:
+            errors.append({
+                "transaction_id": t.get('id'),
+                "node": t.get('node'),
+                "query": t.get('query'),
+                "error": f"Unknown node: {t.get('node')}"
+            })
+
+    # for parallel execution of transactions on the shared, app-wide worker threads
+    try:
+        futures = transaction_executor.submit_batch(concurrency_transaction, runnable)
+    except BatchTooLargeError as e:
+        return jsonify({"status": "rejected", "error": str(e)}), e.status_code
+    except (ExecutorBusyError, ExecutorShutdownError) as e:
+        response = jsonify({"status": "rejected", "error": str(e)})
+        response.headers['Retry-After'] = str(transaction_executor.retry_after)
+        return response, e.status_code
+
+    for future in as_completed(futures):
+        result = future.result()  # wait for each future to complete
+        merge_positions(positions, result['node'], result.pop('position', None))
+        if 'error' in result:
+            errors.append(result)
+        else:
+            results.append(result)
 
     # combine results and errors in the response
-    return jsonify({
+    response = {
         "status": "success" if not errors else "partial_success",
         "results": results,
         "errors": errors
-    })
-
-def concurrency_transaction(t):
-    node = t['node']
-    query = t['query']
-    isolation_level = t.get('isolation', 'READ COMMITTED')
-    status = t.get('status', 'COMMIT')
-    delay = t.get('delay', 0)
-
-    connection = None
-    cursor = None
-    result = None
-
+    }
+    if read_your_writes:
+        # hand this back as ?read_token= so reads wait for node1 to have these writes
+        response["read_token"] = encode_read_token(positions)
+    return jsonify(response)
+
+def payload_error(t):
+    # values that end up in sql have to be what they claim to be: a known isolation
+    # level, a number of seconds to sleep and a list of parameters to bind
     try:
-        connection = get_db_connection(node)
-        cursor = connection.cursor(dictionary=True)
-
-        cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {isolation_level};")
-        cursor.execute("START TRANSACTION;")
-
-        cursor.execute(query)
-        if query.strip().upper().startswith("SELECT"):
-            result = cursor.fetchall()
-
-        if delay != '0':
-            cursor.execute(f"DO SLEEP({delay});")
-
-        if status == 'COMMIT':
-            connection.commit()
-        else:
-            connection.rollback()
-
-        return {
-            "transaction_id": t['id'],
-            "node": node,
-            "query": query,
-            "result": result
-        }
-
-    except Exception as e:
-        if connection:
-            connection.rollback()
-        return {
-            "transaction_id": t['id'],
-            "node": node,
-            "query": query,
-            "error": str(e)
-        }
-
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
-
-def process_transaction(t):
-    node = t['node']
+        normalize_isolation(t.get('isolation', 'READ COMMITTED'))
+    except ValueError as e:
+        return str(e)
+    try:
+        float(t.get('delay', 0))
+    except (TypeError, ValueError):
+        return f"Invalid delay: {t.get('delay')}"
+    if t.get('params') is not None and not isinstance(t['params'], list):
+        return "params must be a list"
+    return None
+
+def precheck_error(t, node, decision):
+    # cheap checks before a connection is taken: the payload has to be valid, the node
+    # has to hold the tables and its circuit breaker has to let the request through
+    wrong = misrouted(decision, node)
+    error = payload_error(t)
+    if not error and wrong:
+        error = f"{', '.join(wrong)} is not stored on {node}"
+    if not error and not is_available(node):
+        error = f"{node} is down (circuit open)"
+    if not error:
+        return None
+    return {
+        "transaction_id": t['id'],
+        "node": node,
+        "query": t['query'],
+        "error": error
+    }
+
+def run_transaction(t, node, *, status='COMMIT', delay=None, message=None):
+    # one transaction on one node: precheck, then run it, retried after a backoff on a
+    # deadlock or lock wait timeout. every sync entry point goes through here
     query = t['query']
     isolation_level = t.get('isolation', 'READ COMMITTED')
+    decision = route(query)
+
+    # a table the node doesn't have or a node that is down fails here, without a round-trip
+    error = precheck_error(t, node, decision)
+    if error:
+        return error
+
+    retry = Retry(node)
+    while True:
+        sleep(retry.backoff())
+
+        connection = None
+        cursor = None
+        timer = PhaseTimer(node, decision.kind)
+
+        try:
+            connection = get_db_connection(node)
+            cursor = connection.cursor(dictionary=True)
+            timer.mark("connect")
+
+            cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {normalize_isolation(isolation_level)};")
+            timer.mark("set_isolation")
+            cursor.execute("START TRANSACTION;")
+            timer.mark("begin")
+
+            # lock waits are part of this phase
+            statement = execute_statement(connection, cursor, query, t.get('params'))
+            result = None
+            if decision.is_read:
+                result = statement.fetchall()
+                timer.rows(len(result))
+            timer.mark("statement")
+
+            if delay is not None and float(delay) > 0:
+                execute_statement(connection, cursor, "DO SLEEP(%s);", [float(delay)])
+                timer.mark("sleep")
+
+            position = None
+            if status == 'COMMIT':
+                connection.commit()
+                timer.mark("commit")
+                if not decision.is_read:
+                    # where the write landed in the home node's binlog, node1 has it once past there
+                    written_at = capture_position(cursor) if node != central_node else None
+                    invalidate_write(decision, node, written_at)  # cached reads of its fragments may be off
+                    if t.get('read_your_writes'):
+                        position = written_at
+            else:
+                connection.rollback()
+                timer.mark("rollback")
+                timer.rollback("requested")
+
+            report_success(node)
+            outcome = {
+                "transaction_id": t['id'],
+                "node": node,
+                "query": query,
+                "result": result
+            }
+            if position is not None:
+                outcome["position"] = position
+            if message:
+                outcome["message"] = message
+            return dict(outcome, **retry.report())
+
+        except Exception as e:
+            report_failure(node, e)
+            timer.error(e)
+            if connection:
+                try:
+                    connection.rollback()
+                    timer.mark("rollback")
+                    timer.rollback("error")
+                except Exception:
+                    pass  # connection is gone, the pool drops it on close()
+            if retry.should_retry(e):
+                continue  # finally hands the connection back before the backoff
+            return {
+                "transaction_id": t['id'],
+                "node": node,
+                "query": query,
+                "error": str(e),
+                **retry.report()
+            }
+
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                connection.close()
+            timer.finish(query)
 
-    connection = None
-    cursor = None
-
-    try:
-        connection = get_db_connection(node)
-        cursor = connection.cursor(dictionary=True)
-
-        cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {isolation_level};")
-        cursor.execute("START TRANSACTION;")
-        
-        cursor.execute(query)
-        result = None
-        if query.strip().upper().startswith("SELECT"):
-            result = cursor.fetchall()
-
-        connection.commit()
-
-        return {
-            "transaction_id": t['id'],
-            "node": node,
-            "query": query,
-            "result": result
-        }
-
-    except Exception as e:
-        if connection:
-            connection.rollback()
-        return {
-            "transaction_id": t['id'],
-            "node": node,
-            "query": query,
-            "error": str(e)
-        }
+def concurrency_transaction(t):
+    return run_transaction(t, t['node'], status=t.get('status', 'COMMIT'), delay=t.get('delay', 0))
 
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+def process_transaction(t):
+    return run_transaction(t, t['node'])
 
 @app.route('/get_combined_records', methods=['GET'])
 def get_combined_records():
-    page = int(request.args.get('page', 1))
     game_id = request.args.get('game_id', '')
-
-    items_per_page = 10
-    offset = (page - 1) * items_per_page
-
-    search_clause = f"WHERE game_id = {game_id}" if game_id else ""
-
-    total_records_query = f"""
-        SELECT COUNT(*) AS total_records
-        FROM (
-            SELECT * FROM games_frag1
-            {search_clause}
-            UNION ALL
-            SELECT * FROM games_frag2
-            {search_clause}
-        ) AS combined_records;
-    """
-
-    paginated_query = f"""
-        SELECT * 
-        FROM (
-            SELECT * FROM games_frag1
-            {search_clause}
-            UNION ALL
-            SELECT * FROM games_frag2
-            {search_clause}
-        ) AS combined_records
-        LIMIT {items_per_page} OFFSET {offset};
-    """
+    page_cursor = request.args.get('cursor', '')
 
     try:
-        connection = get_db_connection("node1")
-        cursor = connection.cursor(dictionary=True)
-
-        cursor.execute(total_records_query)
-        total_records = cursor.fetchone()["total_records"]
+        items_per_page = min(max(int(request.args.get('limit', 10)), 1), 100)
+        page = int(request.args.get('page', 1))
+        direction, boundary = decode_cursor(page_cursor) if page_cursor else (None, None)
+        positions = decode_read_token(request.args.get('read_token', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filters = []
+    filter_params = []
+    if game_id:
+        filters.append("game_id = %s")
+        filter_params.append(game_id)
+    lookup = game_id or None
+
+    # page boundaries stay valid until a write touches any fragment. a cursor request
+    # that also names its page number lets us learn where that page starts
+    page_given = 'page' in request.args
+    search = (tuple(filters), tuple(filter_params), items_per_page)
+    generation = result_cache.generations()
+
+    # per-node connect/statement times are recorded by the scatter reads themselves
+    timer = PhaseTimer("combined", "read")
+    try:
+        total_records = count_combined_records(filters, filter_params, lookup, positions)
+        timer.mark("count")
+
+        # every fragment is read in parallel (node1 while replication is caught up,
+        # the fragment's home node otherwise) and the sorted partial results are merged
+        if direction is None:
+            # page number (page jump in the ui): start from the closest page we know the
+            # boundary of and read forward from there. a jump far past every known page
+            # asks node1 for the boundary instead of pulling all the rows in between
+            page = max(page, 1)
+            known_page, start = page_index.nearest(search, page, generation)
+            if page - known_page > page_index_config["max_prefix_pages"]:
+                found = seek_boundary(filters, filter_params, (page - 1) * items_per_page, positions=positions)
+                if found is not None:
+                    known_page, start = page, found
+                    page_index.put(search, page, found, generation)
+            skip = (page - known_page) * items_per_page
+            seek = filters + ["game_id > %s"] if start is not None else filters
+            seek_params = filter_params + [start] if start is not None else filter_params
+            records = gather_sorted(seek, seek_params, skip + items_per_page + 1, game_id=lookup, positions=positions)
+            if skip and len(records) >= skip:
+                page_index.put(search, page, records[skip - 1]["game_id"], generation)
+            records = records[skip:]
+            has_more = len(records) > items_per_page
+            records = records[:items_per_page]
+            has_less = page > 1
+        else:
+            # keyset page: seek past the boundary key in every fragment, so page N
+            # costs the same as page 1
+            descending = direction == "prev"
+            seek = filters + ["game_id < %s" if descending else "game_id > %s"]
+            records = gather_sorted(seek, filter_params + [boundary], items_per_page + 1, descending,
+                                    game_id=lookup, positions=positions)
+            more_in_direction = len(records) > items_per_page
+            records = records[:items_per_page]
+            if descending:
+                records.reverse()
+            has_more = more_in_direction if not descending else True
+            has_less = more_in_direction if descending else True
+
+        timer.mark("page")
+        timer.rows(len(records))
+
+        # remember where the neighbouring pages start for later page jumps
+        if direction is None or page_given:
+            if direction == "next":
+                page_index.put(search, page, boundary, generation)
+            if records and has_more:
+                page_index.put(search, page + 1, records[-1]["game_id"], generation)
+
+        next_cursor = encode_cursor("next", records[-1]["game_id"]) if records and has_more else None
+        prev_cursor = encode_cursor("prev", records[0]["game_id"]) if records and has_less else None
+
+        return jsonify({
+            "records": records,
+            "total_records": total_records,
+            "next": next_cursor,
+            "prev": prev_cursor
+        })
+    except Exception as e:
+        timer.error(e)
+        return jsonify({"error": str(e)}), 500
+    finally:
+        timer.finish(f"get_combined_records {request.query_string.decode()}")
 
-        cursor.execute(paginated_query)
-        records = cursor.fetchall()
+def count_combined_records(filters, params, game_id=None, positions=None):
+    # the per-fragment counts come out of the result cache until a write touches the fragment
+    return gather_aggregate([("COUNT", "*")], filters, params, game_id, positions)[0]
 
-        cursor.close()
-        connection.close()
+@app.route('/export', methods=['GET'])
+def export_records():
+    export_format = request.args.get('format', 'ndjson')
+    game_id = request.args.get('game_id', '')
 
-        return jsonify({"records": records, "total_records": total_records})
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    try:
+        positions = decode_read_token(request.args.get('read_token', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filters = []
+    filter_params = []
+    if game_id:
+        filters.append("game_id = %s")
+        filter_params.append(game_id)
+
+    # open the fragment cursors before the headers go out, so a dead node is still a 500
+    rows = stream_rows(filters, filter_params, positions)
+    try:
+        first = next(rows, None)
+    except ExportBusyError as e:
+        response = jsonify({"status": "rejected", "error": str(e)})
+        response.headers['Retry-After'] = str(export_config["retry_after"])
+        return response, e.status_code
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    rows = chain([first] if first is not None else [], rows)
+
+    if export_format == 'csv':
+        body, mimetype = csv_lines(rows), 'text/csv'
+    else:
+        body, mimetype = ndjson_lines(rows), 'application/x-ndjson'
+
+    # rows are read from the server chunk by chunk while the response is being sent
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=games.{export_format}'
+    return response
+
+@app.route('/pool_stats', methods=['GET'])
+def pool_stats():
+    return jsonify(get_pool_stats())
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(dict(result_cache.stats(), router=route_cache_info()))
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify(get_health())
+
+@app.route('/replication_lag', methods=['GET'])
+def replication_lag():
+    return jsonify(lag_monitor.status())
+
+# gauges are read when /metrics is scraped
+register_gauge("db_pool_connections", "Pooled connections per node by state (open, idle, in_use, size).",
+               ("node", "state"),
+               lambda: {(node, state): stats[state] for node, stats in get_pool_stats().items()
+                        for state in ("open", "idle", "in_use", "size")})
+register_gauge("db_pool_checkout_timeouts_total", "Connection checkouts that timed out waiting for the pool.", ("node",),
+               lambda: {(node,): stats["timeouts"] for node, stats in get_pool_stats().items()}, kind="counter")
+register_gauge("executor_pending_transactions", "Transactions queued or running on the node's workers.", ("node",),
+               lambda: {(node,): stats["pending"] for node, stats in transaction_executor.stats().items()})
+register_gauge("replay_pending_transactions", "Stashed writes waiting to be replayed on the node.", ("node",),
+               lambda: {(log.node,): log.pending_count() for log in replay_logs.values()})
+register_gauge("result_cache_lookups_total", "Result cache lookups by outcome.", ("outcome",),
+               lambda: {(outcome,): stats[outcome] for stats in [result_cache.stats()]
+                        for outcome in ("hits", "misses")}, kind="counter")
+register_gauge("result_cache_evictions_total", "Result cache entries dropped, by reason.", ("reason",),
+               lambda: {(reason,): stats[reason] for stats in [result_cache.stats()]
+                        for reason in ("evictions", "expired", "invalidated")}, kind="counter")
+register_gauge("result_cache_entries", "Entries in the result cache.", (),
+               lambda: {(): result_cache.stats()["entries"]})
+register_gauge("node_circuit_open", "1 while the node's circuit breaker is open.", ("node",),
+               lambda: {(node,): int(state["state"] == "open") for node, state in get_health().items()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # prometheus text format
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def plan_recovery(t, decision, simulation_case, node_up):
+    # where a crash-recovery transaction runs, shared by the flask and the asgi endpoints.
+    # returns {"node", "on_node", "stash", "error"}: on_node means it was redirected
+    # (process_transaction_on_node), stash names the node whose replay log gets the write
+    plan = {"node": t['node'], "on_node": False, "stash": None, "error": None}
+
+    # if central node is down and target node is central node
+    if (simulation_case == 'case1' or not node_up['node1']) and t['node'] == 'node1':
+        # send it to the home node of the fragment the query touches
+        if len(decision.fragments) == 1:
+            plan.update(node=decision.home_node, on_node=True)
+        else:
+            plan["error"] = "Invalid table reference in query"
+
+    # if either node 2 or node 3 is down and it's the target: reads are served by the
+    # central node, writes are performed on the central node just for viewing purposes
+    # and stashed so they can be retried once the node is turned on again
+    elif simulation_case == 'case2' or not node_up['node2'] or not node_up['node3']:
+        target_node = t['node']
+        if target_node in ('node2', 'node3') and not node_up[target_node]:
+            plan.update(node=central_node, on_node=True)
+            if not decision.is_read:
+                plan["stash"] = target_node
+
+    return plan
 
 @app.route('/simulate_crash_recovery', methods=['POST'])
 def simulate_crash_recovery():
@@ -191,96 +428,33 @@ def simulate_crash_recovery():
     transactions = data.get('transactions', [])
     node_status = data.get('nodeStatus', {})
 
-    global stashed_transactions
-    stashed_transactions = {'node2': [], 'node3': []}
+    # a node is down if the ui says so or its circuit breaker is open
+    node_up = {node: node_status.get(node, True) and is_up(node) for node in db_config}
 
     results = []
     errors = []
 
     # simulate failure cases
     for t in transactions:
-        query = t['query']
-        transaction_id = t['id']
-
-        # if central node is down and target node is central node
-        if simulation_case == 'case1' and t['node'] == 'node1':
-            # Check if the query references 'games_frag1' or 'games_frag2'
-            if 'games_frag1' in query:
-                node = 'node2'  # Execute on node 2
-            elif 'games_frag2' in query:
-                node = 'node3'  # Execute on node 3
-            else:
-                errors.append({
-                    "transaction_id": t['id'],
-                    "error": "Invalid table reference in query"
-                })
-                continue
-
-            # Execute the transaction on the correct node
-            try:
-                result = process_transaction_on_node(t, node)  # Call the modified process function for the right node
-                results.append(result)
-            except Exception as e:
-                errors.append({
-                    "transaction_id": t['id'],
-                    "error": str(e)
-                })
-
-        # if either node 2 or node 3 is down
-        elif simulation_case == 'case2':
-            target_node = t['node']
-
-            # if node 2 is the target and it's down
-            if target_node == 'node2' and not node_status.get('node2', True):
-
-                # if it's a read, then just read from central node
-                if query.strip().upper().startswith("SELECT"):
-                    try:
-                        result = process_transaction_on_node(t, "node1")  # Central node
-                        results.append(result)
-                    except Exception as e:
-                        errors.append({"transaction_id": transaction_id, "error": str(e)})
-                
-                # if it's a write, then perform it on central node just for viewing purposes
-                # stash the transaction, then retry later once the node is turned on again
-                else:
-                    try:
-                        result = process_transaction_on_node(t, "node1")  # Central node
-                        results.append(result)
-                        stashed_transactions["node2"].append(t)  # Stash the transaction
-                    except Exception as e:
-                        errors.append({"transaction_id": transaction_id, "error": str(e)})
-
-            # if node 3 is the target and it's down
-            elif target_node == 'node3' and not node_status.get('node3', True):
-
-                # if it's a read, then just read from central node
-                if query.strip().upper().startswith("SELECT"):
-    
-                    try:
-                        result = process_transaction_on_node(t, "node1")  # Central node
-                        results.append(result)
-                    except Exception as e:
-                        errors.append({"transaction_id": transaction_id, "error": str(e)})
-
-                # if it's a write, then perform it on central node just for viewing purposes
-                # stash the transaction, then retry later once the node is turned on again
-                else:
-                    try:
-                        result = process_transaction_on_node(t, "node1")  # Central node
-                        results.append(result)
-                        stashed_transactions["node3"].append(t)  # Stash the transaction
-                    except Exception as e:
-                        errors.append({"transaction_id": transaction_id, "error": str(e)})
+        plan = plan_recovery(t, route(t['query']), simulation_case, node_up)
+        if plan["error"]:
+            errors.append({"transaction_id": t['id'], "error": plan["error"]})
+            continue
+
+        try:
+            if plan["on_node"]:
+                result = process_transaction_on_node(t, plan["node"])
             else:
-                print('else case in case2/4')
                 result = process_transaction(t)
-                results.append(result)
-
-        else:
-            print('going into last else case')
-            result = process_transaction(t)
             results.append(result)
+            if plan["stash"]:
+                replay_logs[plan["stash"]].append(t)  # Stash the transaction in the node's replay log
+        except Exception as e:
+            errors.append({"transaction_id": t['id'], "error": str(e)})
+
+    # stashed writes are on disk before we answer
+    for log in replay_logs.values():
+        log.sync()
 
     # Return the results and errors
     return jsonify({
@@ -290,67 +464,32 @@ def simulate_crash_recovery():
     })
 
 def process_transaction_on_node(t, node):
-    query = t['query']
-    isolation_level = t.get('isolation', 'READ COMMITTED')
-
-    connection = None
-    cursor = None
-
-    try:
-        # connect to the appropriate node (2 or 3)
-        connection = get_db_connection(node)
-        cursor = connection.cursor(dictionary=True)
-
-        cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {isolation_level};")
-        cursor.execute("START TRANSACTION;")
-
-        cursor.execute(query)
-        result = None
-        if query.strip().upper().startswith("SELECT"):
-            result = cursor.fetchall()
-
-        connection.commit()
-
-        return {
-            "transaction_id": t['id'],
-            "node": node,
-            "query": query,
-            "result": result,
-            "message": f"Query was run on {node}."
-        }
-
-    except Exception as e:
-        if connection:
-            connection.rollback()
-        return {
-            "transaction_id": t['id'],
-            "node": node,
-            "query": query,
-            "error": str(e)
-        }
-
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+    return run_transaction(t, node, message=f"Query was run on {node}.")
 
 @app.route('/retry_stashed_transactions', methods=['POST'])
 def retry_stashed_transactions():
+    data = request.get_json(silent=True) or {}
+    node = data.get('node')
+
+    # the ui retries one node when it comes back up, no node means all of them
+    if node:
+        if node not in replay_logs:
+            return jsonify({"status": "success", "retry_results": [], "retry_errors": []})
+        logs = [replay_logs[node]]
+    else:
+        logs = list(replay_logs.values())
+
     retry_results = []
     retry_errors = []
 
-    for node, transactions in stashed_transactions.items():
-        for t in transactions[:]:  
-            try:
-                result = process_transaction(t)
-                retry_results.append(result)
-                transactions.remove(t) 
-            except Exception as e:
-                retry_errors.append({"transaction_id": t['id'], "error": str(e)})
+    # pending writes are grouped into a few transactions per node, nodes run in parallel
+    for outcome in replay(logs):
+        retry_results.extend(outcome["results"])
+        retry_errors.extend(outcome["errors"])
 
     return jsonify({
         "status": "success" if not retry_errors else "partial_success",
         "retry_results": retry_results,
         "retry_errors": retry_errors,
+        "pending": {log.node: log.pending_count() for log in logs}
     })
@@ -0,0 +1,209 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from app.db_config import central_node, fragment_config, get_db_connection
+from app.health import is_up, report_failure, report_success
+from app.metrics import PhaseTimer
+from app.replication import central_is_fresh, choose_read_node
+from app.result_cache import result_cache
+
+scatter_config = {
+    "workers": 4 * len(fragment_config),
+    "location_cache_size": 10000  # game_id -> fragment entries kept for pruning
+}
+
+AGGREGATES = ("COUNT", "SUM", "MIN", "MAX")
+
+_scatter_pool = ThreadPoolExecutor(max_workers=scatter_config["workers"], thread_name_prefix="scatter")
+
+class LocationCache:
+    # game_id -> fragment, learned from rows we have already read.
+    # the fragments aren't split on a game_id range, so this is what lets a
+    # `game_id = ?` lookup go to one fragment instead of all of them
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, game_id):
+        with self._lock:
+            fragment = self._entries.get(game_id)
+            if fragment is not None:
+                self._entries.move_to_end(game_id)
+            return fragment
+
+    def put(self, game_id, fragment):
+        with self._lock:
+            self._entries[game_id] = fragment
+            self._entries.move_to_end(game_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def forget(self, game_id):
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+location_cache = LocationCache(scatter_config["location_cache_size"])
+
+def _run(node, query, params):
+    # the same few page/count/lookup statements come through here over and over,
+    # as prepared statements they are parsed once per pooled connection
+    timer = PhaseTimer(node, "read")
+    try:
+        connection = get_db_connection(node)
+        timer.mark("connect")
+        try:
+            rows = connection.prepare(query).execute(params).fetchall()
+            report_success(node)
+            timer.mark("statement")
+            timer.rows(len(rows))
+            return rows
+        finally:
+            connection.close()
+    except Exception as e:
+        timer.error(e)
+        raise
+    finally:
+        timer.finish(query)
+
+def query_fragment(fragment, query, params=(), positions=None):
+    # repeated reads come from the result cache until a write touches the fragment.
+    # read-your-writes reads skip it, a cached result may predate node1 catching up
+    if positions:
+        return _read_fragment(fragment, query, params, positions)[1]
+    key = result_cache.key(fragment, query, params)
+    rows = result_cache.get(key)
+    if rows is None:
+        generation = result_cache.generation(fragment)
+        # checked before the read: if node1 had the last write applied then, it is in the rows
+        central_current = _central_has_writes(fragment)
+        node, rows = _read_fragment(fragment, query, params, positions)
+        if node != central_node or central_current:
+            result_cache.put(key, rows, fragment, generation)
+    return rows
+
+def _central_has_writes(fragment):
+    # node1 has executed every write this backend made to the fragment, so its rows
+    # can be cached without outliving a write it hadn't replicated yet
+    awaited, blocked_until = result_cache.awaiting(fragment)
+    if time.monotonic() < blocked_until:
+        return False
+    return awaited is None or central_is_fresh(fragment, {fragment_config[fragment]["home"]: awaited})
+
+def _read_fragment(fragment, query, params=(), positions=None):
+    # node1 serves the fragment while its replication channel is caught up, the home
+    # node otherwise; whichever wasn't picked is the fallback if the first can't be reached.
+    # returns (node that answered, rows)
+    home = fragment_config[fragment]["home"]
+    node = choose_read_node(fragment, positions)
+    fallback = central_node if node == home else home
+    if node == home and not is_up(home):
+        return central_node, _run(central_node, query, params)
+    try:
+        return node, _run(node, query, params)
+    except Exception as e:
+        report_failure(node, e)
+        print(f"Fragment {fragment} unavailable on {node}, reading from {fallback}: {e}")
+        return fallback, _run(fallback, query, params)
+
+def scatter(build_query, params=(), fragments=None, positions=None):
+    # build_query(fragment) -> sql, sent to every fragment in parallel.
+    # positions is a decoded read token (read-your-writes), returns {fragment: rows}
+    fragments = list(fragment_config) if fragments is None else fragments
+    futures = {
+        fragment: _scatter_pool.submit(query_fragment, fragment, build_query(fragment), tuple(params), positions)
+        for fragment in fragments
+    }
+    return {fragment: future.result() for fragment, future in futures.items()}
+
+def _where(filters):
+    return f"WHERE {' AND '.join(filters)}" if filters else ""
+
+def _prune(game_id):
+    # fragments a `game_id = ?` filter can match, all of them if we don't know yet
+    if game_id is None:
+        return None
+    fragment = location_cache.get(str(game_id))
+    return [fragment] if fragment is not None else None
+
+def _remember(fragment_rows, key="game_id"):
+    for fragment, rows in fragment_rows.items():
+        for row in rows:
+            if key in row:
+                location_cache.put(str(row[key]), fragment)
+
+def gather_sorted(filters=(), params=(), limit=None, descending=False, key="game_id", game_id=None, positions=None):
+    # top-n across fragments: ORDER BY/LIMIT run inside every fragment, then the
+    # already-sorted partial results are stream-merged and cut at n
+    order = "DESC" if descending else "ASC"
+    limit_clause = "LIMIT %s" if limit is not None else ""
+    query_params = tuple(params) + ((limit,) if limit is not None else ())
+
+    def build_query(fragment):
+        return f"SELECT * FROM {fragment} {_where(filters)} ORDER BY {key} {order} {limit_clause}"
+
+    pruned = _prune(game_id)
+    fragment_rows = scatter(build_query, query_params, pruned, positions)
+    if pruned is not None and not any(fragment_rows.values()):
+        # the row moved or was deleted since we learned where it lives, ask everyone
+        location_cache.forget(str(game_id))
+        fragment_rows = scatter(build_query, query_params, positions=positions)
+    _remember(fragment_rows, key)
+
+    merged = heapq.merge(*fragment_rows.values(), key=lambda row: row[key], reverse=descending)
+    return list(islice(merged, limit))
+
+def seek_boundary(filters=(), params=(), offset=0, key="game_id", positions=None):
+    # key of the row just before `offset` in merged order. node1 holds every fragment,
+    # so the skip happens inside mysql over the key alone and a single row comes back.
+    # None when node1 can't serve every fragment right now (lagging, down, read token)
+    if offset <= 0 or not is_up(central_node):
+        return None
+    if any(choose_read_node(fragment, positions) != central_node for fragment in fragment_config):
+        return None
+    union = " UNION ALL ".join(f"SELECT {key} FROM {fragment} {_where(filters)}" for fragment in fragment_config)
+    query = f"SELECT {key} FROM ({union}) AS merged ORDER BY {key} LIMIT 1 OFFSET %s"
+    try:
+        rows = _run(central_node, query, tuple(params) * len(fragment_config) + (offset - 1,))
+    except Exception as e:
+        report_failure(central_node, e)
+        return None
+    return rows[0][key] if rows else None
+
+def gather_aggregate(aggregates, filters=(), params=(), game_id=None, positions=None):
+    # aggregates: [("COUNT", "*"), ("MAX", "price"), ...]
+    # every fragment computes its partial, the partials are combined here
+    # (COUNT and SUM add up, MIN/MAX take the min/max of the partials)
+    columns = []
+    for i, (func, column) in enumerate(aggregates):
+        func = func.upper()
+        if func not in AGGREGATES:
+            raise ValueError(f"Unsupported aggregate: {func}")
+        columns.append(f"{func}({column}) AS agg_{i}")
+
+    def build_query(fragment):
+        return f"SELECT {', '.join(columns)} FROM {fragment} {_where(filters)}"
+
+    pruned = _prune(game_id)
+    fragment_rows = scatter(build_query, params, pruned, positions)
+    if pruned is not None and not any(rows and rows[0]["agg_0"] for rows in fragment_rows.values()):
+        location_cache.forget(str(game_id))
+        fragment_rows = scatter(build_query, params, positions=positions)
+
+    combined = []
+    for i, (func, _) in enumerate(aggregates):
+        func = func.upper()
+        partials = [rows[0][f"agg_{i}"] for rows in fragment_rows.values() if rows]
+        partials = [p for p in partials if p is not None]
+        if func in ("COUNT", "SUM"):
+            combined.append(sum(partials) if partials or func == "COUNT" else None)
+        elif func == "MIN":
+            combined.append(min(partials) if partials else None)
+        else:
+            combined.append(max(partials) if partials else None)
+    return combined
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from topology import fragment_config
+
+# drives the running backend (python run.py / run_asgi.py) with a workload mix and
+# reports throughput and p50/p95/p99 latency per endpoint and per node
+#   python -m benchmark.loadgen --workload paging contention --duration 30 --label before
+#   python -m benchmark.loadgen --workload all --compare benchmark/results/before-....json
+
+ISOLATION_LEVELS = ["READ UNCOMMITTED", "READ COMMITTED", "REPEATABLE READ", "SERIALIZABLE"]
+WORKLOADS = ["paging", "contention", "failover"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def add(self, endpoint, node, seconds, ok):
+        with self._lock:
+            self.samples.append((endpoint, node, seconds, ok))
+
+def percentile(sorted_values, p):
+    # nearest-rank
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(samples, elapsed):
+    summary = {"count": len(samples), "errors": sum(1 for s in samples if not s[3])}
+    latencies = sorted(s[2] * 1000 for s in samples)
+    summary["throughput"] = len(samples) / elapsed if elapsed else 0
+    for p in (50, 95, 99):
+        summary[f"p{p}_ms"] = percentile(latencies, p)
+    summary["max_ms"] = latencies[-1] if latencies else None
+    return summary
+
+def report(recorder, elapsed):
+    by_endpoint = {}
+    by_node = {}
+    for sample in recorder.samples:
+        by_endpoint.setdefault(sample[0], []).append(sample)
+        by_node.setdefault(sample[1] or "combined", []).append(sample)
+    return {
+        "elapsed_seconds": elapsed,
+        "endpoints": {name: summarize(samples, elapsed) for name, samples in sorted(by_endpoint.items())},
+        "nodes": {name: summarize(samples, elapsed) for name, samples in sorted(by_node.items())}
+    }
+
+def call(recorder, base_url, method, path, endpoint, node=None, body=None, timeout=60):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = json.loads(response.read() or b"null")
+        ok = not (isinstance(payload, dict) and (payload.get("errors") or payload.get("retry_errors")))
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        payload = {"error": str(e)}
+        ok = False
+    recorder.add(endpoint, node, time.perf_counter() - started, ok)
+    return payload
+
+def paging_worker(recorder, args, rng, deadline, total_pages, game_ids):
+    # read-heavy: random page jumps, cursor walks and game_id lookups
+    cursor = None
+    while time.monotonic() < deadline:
+        roll = rng.random()
+        if roll < 0.4:
+            page = rng.randint(1, max(total_pages, 1))
+            call(recorder, args.url, "GET", f"/get_combined_records?page={page}", "get_combined_records:page")
+        elif roll < 0.8:
+            path = "/get_combined_records" + (f"?cursor={cursor}" if cursor else "")
+            payload = call(recorder, args.url, "GET", path, "get_combined_records:cursor")
+            cursor = payload.get("next") if isinstance(payload, dict) else None
+        else:
+            game_id = rng.choice(game_ids) if game_ids else rng.randint(1, 1000)
+            call(recorder, args.url, "GET", f"/get_combined_records?game_id={game_id}", "get_combined_records:lookup")
+
+def contention_worker(recorder, args, rng, deadline, hot_keys):
+    # batches of no-op updates on a few hot rows: each one still takes the row lock
+    fragments = list(fragment_config)
+    while time.monotonic() < deadline:
+        fragment = rng.choice(fragments)
+        node = fragment_config[fragment]["home"]
+        isolation = rng.choice(args.isolation)
+        transactions = []
+        for i in range(args.batch):
+            game_id = rng.choice(hot_keys[fragment])
+            transactions.append({
+                "id": i + 1,
+                "node": node,
+                "isolation": isolation,
+                "query": f"UPDATE {fragment} SET game_id = game_id WHERE game_id = %s",
+                "params": [game_id],
+                "delay": args.delay
+            })
+        call(recorder, args.url, "POST", "/simulate", f"simulate:{isolation}", node, {"transactions": transactions})
+
+def failover_worker(recorder, args, rng, deadline, hot_keys):
+    # node3 reported down: writes go to node1 and are stashed, then replayed every few rounds
+    fragment = list(fragment_config)[-1]
+    node = fragment_config[fragment]["home"]
+    rounds = 0
+    while time.monotonic() < deadline:
+        transactions = [{
+            "id": rng.randint(1, 10 ** 9),
+            "node": node,
+            "isolation": "READ COMMITTED",
+            "query": f"UPDATE {fragment} SET game_id = game_id WHERE game_id = %s",
+            "params": [rng.choice(hot_keys[fragment])]
+        } for _ in range(args.batch)]
+        call(recorder, args.url, "POST", "/simulate_crash_recovery", "simulate_crash_recovery", node,
+             {"simulationCase": "case2", "nodeStatus": {node: False}, "transactions": transactions})
+        rounds += 1
+        if rounds % args.replay_every == 0:
+            call(recorder, args.url, "POST", "/retry_stashed_transactions", "retry_stashed_transactions", node,
+                 {"node": node})
+
+def discover(args):
+    # total pages and some real game_ids per fragment, so lookups and hot keys hit rows
+    probe = Recorder()
+    first = call(probe, args.url, "GET", "/get_combined_records?limit=100", "probe")
+    if not isinstance(first, dict) or "records" not in first:
+        raise SystemExit(f"Backend at {args.url} is not answering: {first}")
+    total_pages = max(1, (first.get("total_records") or 0) // 10)
+    game_ids = [row["game_id"] for row in first["records"]]
+
+    hot_keys = {}
+    for fragment, config in fragment_config.items():
+        payload = call(probe, args.url, "POST", "/simulate", "probe", body={"transactions": [{
+            "id": 1,
+            "node": config["home"],
+            "query": f"SELECT game_id FROM {fragment} ORDER BY game_id LIMIT {args.hot_keys}"
+        }]})
+        rows = (payload.get("results") or [{}])[0].get("result") or []
+        hot_keys[fragment] = [row["game_id"] for row in rows] or list(range(1, args.hot_keys + 1))
+    return total_pages, game_ids, hot_keys
+
+def run(args):
+    rng = random.Random(args.seed)
+    total_pages, game_ids, hot_keys = discover(args)
+    workloads = WORKLOADS if "all" in args.workload else args.workload
+
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency * len(workloads)) as pool:
+        for i in range(args.concurrency):
+            worker_rng = random.Random(rng.random())
+            if "paging" in workloads:
+                pool.submit(paging_worker, recorder, args, worker_rng, deadline, total_pages, game_ids)
+            if "contention" in workloads:
+                pool.submit(contention_worker, recorder, args, worker_rng, deadline, hot_keys)
+            if "failover" in workloads and i == 0:
+                # one writer is enough to keep the stash and replay busy
+                pool.submit(failover_worker, recorder, args, worker_rng, deadline, hot_keys)
+    elapsed = time.monotonic() - started
+
+    result = report(recorder, elapsed)
+    result["config"] = {
+        "url": args.url,
+        "workloads": workloads,
+        "duration": args.duration,
+        "concurrency": args.concurrency,
+        "isolation": args.isolation,
+        "batch": args.batch,
+        "delay": args.delay,
+        "hot_keys": args.hot_keys,
+        "label": args.label,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    return result
+
+def print_table(title, rows, baseline=None):
+    print(f"\n{title}")
+    print(f"  {'name':40} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, s in rows.items():
+        line = (f"  {name:40} {s['count']:>7} {s['errors']:>5} {s['throughput']:>8.1f} "
+                f"{_ms(s['p50_ms']):>9} {_ms(s['p95_ms']):>9} {_ms(s['p99_ms']):>9}")
+        before = (baseline or {}).get(name)
+        if before:
+            line += "   vs baseline: " + ", ".join(
+                f"{key} {_delta(before.get(key), s.get(key))}" for key in ("throughput", "p50_ms", "p95_ms", "p99_ms")
+            )
+        print(line)
+
+def _ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+def _delta(before, after):
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.0f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the backend endpoints")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--workload", nargs="+", choices=WORKLOADS + ["all"], default=["all"])
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads per workload")
+    parser.add_argument("--isolation", nargs="+", choices=ISOLATION_LEVELS, default=ISOLATION_LEVELS,
+                        help="isolation levels the contention workload cycles through")
+    parser.add_argument("--batch", type=int, default=5, help="transactions per /simulate or recovery request")
+    parser.add_argument("--delay", default="0", help="DO SLEEP seconds inside each contention transaction")
+    parser.add_argument("--hot-keys", type=int, default=3, help="rows per fragment the contention targets")
+    parser.add_argument("--replay-every", type=int, default=5, help="failover rounds between replays")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", default="run", help="name used in the results file")
+    parser.add_argument("--compare", help="earlier results json to compare against")
+    parser.add_argument("--no-save", action="store_true", help="don't write a results file")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table("Per endpoint", result["endpoints"], baseline and baseline.get("endpoints"))
+    print_table("Per node", result["nodes"], baseline and baseline.get("nodes"))
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{args.label}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved {path}")
+
+if __name__ == "__main__":
+    main()
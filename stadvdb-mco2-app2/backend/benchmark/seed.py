@@ -0,0 +1,149 @@
+import argparse
+import datetime
+import random
+import string
+import time
+from decimal import Decimal
+
+import mysql.connector
+
+from topology import central_node, db_config, fragment_config
+
+# fills games_frag1 / games_frag2 on their home nodes (node1 gets them through replication)
+#   python -m benchmark.seed --rows 1000000
+# run from the backend folder so the node settings come from topology.py
+
+DEFAULT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        game_id INT PRIMARY KEY,
+        name VARCHAR(255),
+        release_date DATE,
+        required_age INT,
+        price DECIMAL(10, 2),
+        positive_ratings INT,
+        negative_ratings INT
+    )
+"""
+
+def connect(node):
+    return mysql.connector.connect(
+        host=db_config[node]["host"],
+        port=db_config[node]["port"],
+        user=db_config[node]["user"],
+        password=db_config[node]["password"],
+        database=db_config[node]["database"]
+    )
+
+def table_columns(cursor, table):
+    # (name, data_type, max length) of an existing table, in column order
+    cursor.execute(
+        """
+        SELECT COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY ORDINAL_POSITION
+        """,
+        (table,)
+    )
+    return cursor.fetchall()
+
+def fake_value(data_type, length, rng):
+    # something of the right type for a column we know nothing else about
+    if data_type in ("int", "bigint", "smallint", "mediumint"):
+        return rng.randint(0, 100000)
+    if data_type == "tinyint":
+        return rng.randint(0, 1)
+    if data_type in ("decimal", "float", "double"):
+        return Decimal(rng.randint(0, 9999)) / 100
+    if data_type == "date":
+        return datetime.date(2000, 1, 1) + datetime.timedelta(days=rng.randint(0, 9000))
+    if data_type in ("datetime", "timestamp"):
+        return datetime.datetime(2000, 1, 1) + datetime.timedelta(seconds=rng.randint(0, 9000 * 86400))
+    if data_type == "year":
+        return rng.randint(1990, 2024)
+    size = min(length or 32, 32)
+    return "".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(1, size)))
+
+def fragment_for(game_id, split, rows, start_id):
+    fragments = list(fragment_config)
+    if split == "range":
+        return fragments[0] if game_id - start_id < rows // 2 else fragments[1]
+    return fragments[game_id % 2]
+
+def seed(rows, batch_size, split, truncate, include_central, seed_value):
+    rng = random.Random(seed_value)
+    targets = {fragment: [config["home"]] for fragment, config in fragment_config.items()}
+    if include_central:
+        # no replication set up locally: write node1's copy directly as well
+        for nodes in targets.values():
+            nodes.append(central_node)
+
+    connections = {}
+    columns = {}
+    start_id = 1
+    for fragment, nodes in targets.items():
+        for node in nodes:
+            if node not in connections:
+                connections[node] = connect(node)
+            cursor = connections[node].cursor()
+            cursor.execute(DEFAULT_SCHEMA.format(table=fragment))
+            if truncate:
+                cursor.execute(f"TRUNCATE TABLE {fragment}")
+            columns[fragment] = table_columns(cursor, fragment)
+            cursor.execute(f"SELECT COALESCE(MAX(game_id), 0) FROM {fragment}")
+            start_id = max(start_id, cursor.fetchone()[0] + 1)
+            cursor.close()
+
+    statements = {}
+    for fragment, cols in columns.items():
+        names = ", ".join(f"`{name}`" for name, _, _ in cols)
+        placeholders = ", ".join(["%s"] * len(cols))
+        statements[fragment] = f"INSERT INTO {fragment} ({names}) VALUES ({placeholders})"
+
+    started = time.monotonic()
+    pending = {fragment: [] for fragment in fragment_config}
+    inserted = 0
+
+    def flush(fragment):
+        for node in targets[fragment]:
+            cursor = connections[node].cursor()
+            cursor.executemany(statements[fragment], pending[fragment])
+            connections[node].commit()
+            cursor.close()
+        pending[fragment].clear()
+
+    for game_id in range(start_id, start_id + rows):
+        fragment = fragment_for(game_id, split, rows, start_id)
+        row = []
+        for name, data_type, length in columns[fragment]:
+            row.append(game_id if name == "game_id" else fake_value(data_type, length, rng))
+        pending[fragment].append(tuple(row))
+        if len(pending[fragment]) >= batch_size:
+            inserted += len(pending[fragment])
+            flush(fragment)
+            print(f"  {inserted}/{rows} rows ({inserted / (time.monotonic() - started):.0f} rows/s)")
+
+    for fragment in fragment_config:
+        if pending[fragment]:
+            inserted += len(pending[fragment])
+            flush(fragment)
+
+    for connection in connections.values():
+        connection.close()
+    print(f"Seeded {inserted} rows (game_id {start_id}..{start_id + rows - 1}) in {time.monotonic() - started:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed games_frag1/games_frag2 for benchmarking")
+    parser.add_argument("--rows", type=int, default=10000, help="rows to add across both fragments (10k to 10M)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per multi-row insert")
+    parser.add_argument("--split", choices=["parity", "range"], default="parity",
+                        help="parity: odd/even game_ids per fragment, range: first half / second half")
+    parser.add_argument("--truncate", action="store_true", help="empty the fragments first")
+    parser.add_argument("--include-central", action="store_true",
+                        help="also write node1's copy (when replication isn't running)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for generated values")
+    args = parser.parse_args()
+    seed(args.rows, args.batch_size, args.split, args.truncate, args.include_central, args.seed)
+
+if __name__ == "__main__":
+    main()
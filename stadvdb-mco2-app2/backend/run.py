@@ -1,4 +1,11 @@
+import os
+
 from app import app
+from app.health import health_monitor
 
 if __name__ == "__main__":
+    # ping the nodes in the background (feeds the circuit breakers and /health). the debug
+    # reloader runs this file twice, only the child that serves requests needs the monitor
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        health_monitor.start()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,5 @@
+import uvicorn
+
+if __name__ == "__main__":
+    # async /simulate and /simulate_crash_recovery, everything else served by the flask app
+    uvicorn.run("app.async_app:asgi_app", host="127.0.0.1", port=5000)
@@ -0,0 +1,92 @@
+import pytest
+
+from app.router import misrouted, normalize, route, tokenize
+
+# the router only looks at sql text, no node has to be up for these
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM games_frag1 WHERE name = 'UPDATE games_frag2 SET price = 0'",
+    'SELECT "FROM games_frag2" FROM games_frag1',
+    "SELECT * FROM games_frag1 WHERE name = 'it''s' OR name = 'a\\'b JOIN games_frag2'",
+    "SELECT * FROM games_frag1 -- JOIN games_frag2\nWHERE game_id = 1",
+    "SELECT * FROM games_frag1 /* , games_frag2 */ WHERE game_id = 1",
+    "# DELETE FROM games_frag2\nSELECT * FROM games_frag1",
+])
+def test_strings_and_comments_are_not_sql(query):
+    decision = route(query)
+    assert decision.kind == "read"
+    assert decision.fragments == ("games_frag1",)
+    assert decision.home_node == "node2"
+
+def test_for_update_is_a_read_of_one_table():
+    decision = route("SELECT * FROM games_frag2 WHERE game_id = 4 FOR UPDATE")
+    assert decision.kind == "read"
+    assert decision.tables == ("games_frag2",)
+
+def test_on_duplicate_key_update_is_not_a_table():
+    decision = route(
+        "INSERT INTO games_frag2 (game_id, price) VALUES (1, 2) "
+        "ON DUPLICATE KEY UPDATE price = VALUES(price)"
+    )
+    assert decision.kind == "write"
+    assert decision.tables == ("games_frag2",)
+    assert decision.home_node == "node3"
+
+def test_set_game_id_is_a_write_to_the_updated_fragment():
+    decision = route("UPDATE games_frag1 SET game_id = 7 WHERE game_id = 3")
+    assert decision.kind == "write"
+    assert decision.tables == ("games_frag1",)
+    assert decision.home_node == "node2"
+
+def test_or_keeps_a_single_fragment():
+    decision = route("SELECT * FROM games_frag1 WHERE game_id = 1 OR price > 10")
+    assert decision.fragments == ("games_frag1",)
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM justgames.games_frag1 g JOIN `justgames`.`games_frag2` AS h ON g.game_id = h.game_id",
+    "SELECT * FROM games_frag1 a, games_frag2 b WHERE a.game_id = b.game_id",
+    "(SELECT * FROM games_frag1) UNION (SELECT * FROM games_frag2)",
+])
+def test_reads_across_both_fragments_go_to_the_central_node(query):
+    decision = route(query)
+    assert decision.kind == "read"
+    assert decision.fragments == ("games_frag1", "games_frag2")
+    assert decision.home_node == "node1"
+
+def test_write_across_both_fragments_has_no_home():
+    decision = route("DELETE games_frag1, games_frag2 FROM games_frag1 JOIN games_frag2 USING (game_id)")
+    assert decision.kind == "write"
+    assert decision.home_node is None
+
+def test_cte_takes_the_kind_of_the_main_statement():
+    read = route("WITH cheap AS (SELECT * FROM games_frag1 WHERE price < 5) SELECT * FROM cheap")
+    assert read.kind == "read"
+    assert read.fragments == ("games_frag1",)
+
+    write = route(
+        "WITH ids AS (SELECT game_id FROM games_frag2) "
+        "DELETE FROM games_frag2 WHERE game_id IN (SELECT game_id FROM ids)"
+    )
+    assert write.kind == "write"
+    assert write.fragments == ("games_frag2",)
+
+def test_statements_without_a_verb_are_other():
+    assert route("SET SESSION sql_mode = ''").kind == "other"
+    assert route("CREATE TABLE games_frag1 (game_id INT)").kind == "other"
+
+def test_misrouted_names_fragments_the_node_does_not_hold():
+    decision = route("SELECT * FROM games_frag1 JOIN games_frag2 USING (game_id)")
+    assert misrouted(decision, "node2") == ["games_frag2"]
+    assert misrouted(decision, "node1") == []
+
+def test_tokenize_unquotes_names_and_strings():
+    assert tokenize("SELECT `a``b`, 'x' -- c") == [
+        ("word", "SELECT", "SELECT"),
+        ("name", "a`b", "`a``b`"),
+        ("op", ",", ","),
+        ("string", "x", "'x'"),
+    ]
+
+def test_normalize_keeps_line_breaks_that_end_comments():
+    assert normalize("SELECT  *\n   FROM t -- c\n  WHERE 1 ;") == "SELECT *\nFROM t -- c\nWHERE 1"
+    assert route("SELECT * FROM games_frag1 -- c\nJOIN games_frag2 USING (game_id)").home_node == "node1"
@@ -0,0 +1,16 @@
+# where the nodes are and which node each fragment lives on. kept out of the app
+# package so the benchmark scripts can read it without starting the backend
+
+db_config = {
+    "node1": {"host": "localhost", "port": 3306, "user": "replication_user", "password": " ", "database": "justgames"}, # change pw into ur own
+    "node2": {"host": "localhost", "port": 3307, "user": "replication_user", "password": " ", "database": "justgames"}, # change pw into ur own
+    "node3": {"host": "localhost", "port": 3308, "user": "replication_user", "password": " ", "database": "justgames"}  # change pw into ur own
+}
+
+# node1 is the central node, it replicates both fragments from their home nodes
+central_node = "node1"
+
+fragment_config = {
+    "games_frag1": {"home": "node2"},
+    "games_frag2": {"home": "node3"}
+}
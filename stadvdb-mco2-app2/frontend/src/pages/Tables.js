@@ -5,6 +5,9 @@ const Tables = () => {
     const [records, setRecords] = useState([]); // Holds the table data
     const [columns, setColumns] = useState([]); // Holds table column names
     const [page, setPage] = useState(1); // Current page number
+    const [cursor, setCursor] = useState(""); // next/prev token used to load the page, empty for page jumps
+    const [nextCursor, setNextCursor] = useState(null); // token for the page after this one
+    const [prevCursor, setPrevCursor] = useState(null); // token for the page before this one
     const [totalPages, setTotalPages] = useState(1); // Total number of pages
     const [inputPage, setInputPage] = useState(1); // For page input field
     const [searchGameId, setSearchGameId] = useState(""); // Search field for game_id
@@ -14,11 +17,13 @@ const Tables = () => {
     const itemsPerPage = 10; // Rows per page
 
     // Fetch records from the backend
-    const fetchRecords = async () => {
+    const fetchRecords = async (pageCursor = cursor) => {
         setLoading(true);
         try {
+            // Previous/Next send the token so the backend seeks straight to the page
+            const cursorParam = pageCursor ? `&cursor=${encodeURIComponent(pageCursor)}` : "";
             const response = await axios.get(
-                `http://localhost:5000/get_combined_records?page=${page}&game_id=${searchGameId}`
+                `http://localhost:5000/get_combined_records?page=${page}&game_id=${searchGameId}${cursorParam}`
             );
             const data = response.data.records;
             const totalRecords = response.data.total_records;
@@ -28,6 +33,8 @@ const Tables = () => {
             }
     
             setRecords(data);
+            setNextCursor(response.data.next);
+            setPrevCursor(response.data.prev);
             setTotalPages(Math.ceil(totalRecords / itemsPerPage)); // Calculate total pages
             setError(null);
         } catch (err) {
@@ -46,14 +53,16 @@ const Tables = () => {
     // Handle page jump
     const handlePageJump = () => {
         if (inputPage >= 1 && inputPage <= totalPages) {
+            setCursor("");
             setPage(inputPage);
         }
     };
 
     // Handle search
     const handleSearch = () => {
+        setCursor("");
         setPage(1); // Reset to the first page on a new search
-        fetchRecords();
+        fetchRecords("");
     };
 
     return (
@@ -127,7 +136,10 @@ const Tables = () => {
                     <div className="flex items-center justify-center mt-4 space-x-4">
                         <button
                             disabled={page === 1}
-                            onClick={() => setPage(page - 1)}
+                            onClick={() => {
+                                setCursor(prevCursor);
+                                setPage(page - 1);
+                            }}
                             className="px-4 py-2 bg-blue-500 text-white rounded-md hover:bg-blue-600 disabled:bg-gray-300 disabled:cursor-not-allowed"
                         >
                             Previous
@@ -154,7 +166,10 @@ const Tables = () => {
 
                         <button
                             disabled={page === totalPages}
-                            onClick={() => setPage(page + 1)}
+                            onClick={() => {
+                                setCursor(nextCursor);
+                                setPage(page + 1);
+                            }}
                             className="px-4 py-2 bg-blue-500 text-white rounded-md hover:bg-blue-600 disabled:bg-gray-300 disabled:cursor-not-allowed"
                         >
                             Next